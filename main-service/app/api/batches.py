@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.postgres import get_db
+from app.db.repositories.user_repository import UserRepository
+from app.schemas.batch import BatchResponse
+from app.utils.applicant_batch import applicant_batches, batch_format, parse_document_type
+from typing import Optional
+
+router = APIRouter(prefix="/batches", tags=["batches"])
+
+@router.post("/", response_model=BatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_batch(
+    file: UploadFile = File(...),
+    document_type: Optional[str] = Form(None),
+    user_id: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Submit a CSV or NDJSON file of applicants for PAN card, Voter ID or
+    Learner License registration.
+
+    Each row holds the applicant's fields and optionally a document_type
+    column; rows without one use the document_type form field. Valid rows are
+    queued as automation jobs and invalid rows are reported with their errors.
+    Follow the progress with GET /batches/{batch_id}.
+    """
+    file_format = batch_format(file.filename, file.content_type)
+    if not file_format:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be CSV (.csv) or NDJSON (.ndjson, .jsonl)"
+        )
+    default_type = parse_document_type(document_type)
+    if document_type and not default_type:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown document type: {document_type}"
+        )
+    if user_id is not None:
+        user = await UserRepository(db).get_user_by_id(user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+
+    batch = await applicant_batches.submit(file, file_format, default_type, user_id)
+    return await applicant_batches.progress(batch)
+
+@router.get("/{batch_id}", response_model=BatchResponse)
+async def get_batch(batch_id: str):
+    """Get the progress of a batch, with the status and errors of every row"""
+    batch = await applicant_batches.get(batch_id)
+    if not batch:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+    return await applicant_batches.progress(batch)
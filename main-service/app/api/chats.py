@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.db.postgres import get_db
-from app.db.repositories.chat_repository import ChatRepository
+from app.db.repositories.chat_repository import get_chat_repository
 from app.db.repositories.user_repository import UserRepository
-from app.schemas.chat import Chat, ChatCreate, ChatMessageCreate, MessageResponse, ChatResponse
-from app.schemas.chat import MessageSender, format_messages_for_gemini
-from app.utils.gemini_assistant import GeminiAssistant
-from typing import List
+from app.schemas.chat import Chat, ChatCreate, ChatMessage, ChatMessageCreate, MessageResponse, ChatResponse, MessageListResponse
+from app.schemas.chat import ChatSummaryPage
+from app.schemas.chat import MessageSender
+from app.utils.gemini_assistant import GeminiAssistant, get_gemini_assistant
+from app.utils.chat_broker import chat_broker
+from app.utils.chat_context import build_chat_context, is_summary_stale, refresh_chat_summary
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+import asyncio
 import json
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE_INTERVAL = 15
+
+def _sse_event(event: str, data: str, event_id: Optional[int] = None) -> str:
+    """Format a single Server-Sent Event"""
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"event: {event}\n{id_line}{lines}\n"
+
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 async def create_chat(
     chat_in: ChatCreate,
@@ -27,7 +44,7 @@ async def create_chat(
         )
     
     # Create new chat
-    chat_repo = ChatRepository()
+    chat_repo = get_chat_repository()
     chat = await chat_repo.create_chat(chat_in)
     
     return chat
@@ -48,17 +65,67 @@ async def get_user_chats(
         )
     
     # Get all chats for the user
-    chat_repo = ChatRepository()
+    chat_repo = get_chat_repository()
     chats = await chat_repo.list_user_chats(user_id)
     
     return chats
 
+def _encode_summary_cursor(updated_at: datetime, chat_id: str) -> str:
+    """Encode the position of a chat in the chat list as an opaque cursor"""
+    return f"{updated_at.isoformat()}|{chat_id}"
+
+def _decode_summary_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a chat list cursor, raising a 400 error if it is malformed"""
+    try:
+        updated_at, chat_id = cursor.split("|", 1)
+        return datetime.fromisoformat(updated_at), chat_id
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+@router.get("/user/{user_id}/summaries", response_model=ChatSummaryPage)
+async def get_user_chat_summaries(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List a user's chats for the chat list screen, most recently updated first
+    
+    Returns message counts and a preview of the last message instead of the full
+    message history. Use next_cursor to fetch older chats.
+    """
+    before = _decode_summary_cursor(cursor) if cursor else None
+    
+    # Verify that the user exists
+    user_repo = UserRepository(db)
+    user = await user_repo.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Fetch one extra chat to know whether there is another page
+    chat_repo = get_chat_repository()
+    summaries = await chat_repo.list_user_chat_summaries(user_id, limit=limit + 1, before=before)
+    
+    next_cursor = None
+    if len(summaries) > limit:
+        summaries = summaries[:limit]
+        next_cursor = _encode_summary_cursor(summaries[-1].updated_at, summaries[-1].chat_id)
+    
+    return ChatSummaryPage(chats=summaries, next_cursor=next_cursor)
+
 @router.get("/{chat_id}", response_model=ChatResponse)
 async def get_chat(
     chat_id: str
 ):
     """Get a specific chat by ID"""
-    chat_repo = ChatRepository()
+    chat_repo = get_chat_repository()
     chat = await chat_repo.get_chat(chat_id)
     
     if not chat:
@@ -69,17 +136,87 @@ async def get_chat(
     
     return chat
 
+@router.get("/{chat_id}/events")
+async def subscribe_to_chat(
+    chat_id: str
+):
+    """
+    Subscribe to a chat and receive new messages as Server-Sent Events
+    
+    Each stored message is pushed once as a `message` event containing the
+    ChatMessage JSON, with the message's seq as the event id. Replaces polling
+    GET /chats/{chat_id} for new messages; after a reconnect, clients catch up
+    with GET /chats/{chat_id}/messages?after=<last event id>.
+    """
+    chat_repo = get_chat_repository()
+    if not await chat_repo.chat_exists(chat_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    
+    async def event_stream() -> AsyncIterator[str]:
+        async with chat_broker.subscribe(chat_id) as queue:
+            while True:
+                try:
+                    new_message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    # Keep proxies and mobile networks from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event("message", new_message.json(), event_id=new_message.seq)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+@router.get("/{chat_id}/messages", response_model=MessageListResponse)
+async def get_messages(
+    chat_id: str,
+    after: int = Query(0, ge=0, description="Return messages with a seq greater than this cursor"),
+    limit: int = Query(50, ge=1, le=200)
+):
+    """Get the messages of a chat that follow a cursor, oldest first"""
+    chat_repo = get_chat_repository()
+    result = await chat_repo.get_messages_after(chat_id, after=after, limit=limit)
+    
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    
+    messages, message_count = result
+    next_cursor = messages[-1].seq if messages else min(after, message_count)
+    return MessageListResponse(
+        chat_id=chat_id,
+        messages=messages,
+        next_cursor=next_cursor,
+        has_more=next_cursor < message_count
+    )
+
 @router.post("/{chat_id}/messages", response_model=MessageResponse)
 async def add_message(
     chat_id: str,
     message: ChatMessageCreate,
-    db: AsyncSession = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    gemini: GeminiAssistant = Depends(get_gemini_assistant)
 ):
     """Add a message to a chat"""
-    chat_repo = ChatRepository()
+    chat_repo = get_chat_repository()
+    is_user_message = message.sent_from == MessageSender.USER
     
-    # Verify that the chat exists
-    chat = await chat_repo.get_chat(chat_id)
+    # Verify that the chat exists; only a user message needs recent history, for the AI reply
+    if is_user_message:
+        chat = await chat_repo.get_chat_tail(chat_id, settings.CHAT_CONTEXT_MAX_MESSAGES)
+    else:
+        chat = await chat_repo.get_chat(chat_id, with_messages=False)
     if not chat:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -95,49 +232,148 @@ async def add_message(
             detail="User not found"
         )
     
-    # Add the user message
-    message_response = await chat_repo.add_message(chat_id, message, chat.user_id)
+    # Store the user message before generating the reply, so it is kept if the
+    # reply fails and subscribers see it while the reply is generated
+    new_message = ChatMessage(user_id=chat.user_id, **message.dict())
+    if not await chat_repo.add_messages(chat_id, [new_message]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
     
     # If the message is from user, process it with Gemini and generate a response
-    if message.sent_from == MessageSender.USER:
-        # Get the full chat history for context
-        updated_chat = await chat_repo.get_chat(chat_id)
-        
-        if not updated_chat or not updated_chat.messages:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Could not retrieve updated chat history"
-            )
-            
-        # Format the chat messages into a conversational format that Gemini can understand
-        formatted_chat_history = format_messages_for_gemini(updated_chat.messages)
+    if is_user_message:
+        # Format the recent messages and the summary of older ones into a conversational format that Gemini can understand
+        formatted_chat_history, dropped_upto = build_chat_context(chat, [new_message])
         print(f"FORMATTED CHAT HISTORY: {formatted_chat_history}")
         
-        gemini = GeminiAssistant()
+        # Fold messages that left the context window into the summary after responding
+        if is_summary_stale(chat, dropped_upto):
+            background_tasks.add_task(refresh_chat_summary, chat_repo, gemini, chat, dropped_upto)
         # Process the formatted chat history
         response_text, automation_type = await gemini.process_chat(
             chat_history=formatted_chat_history, 
-            language=user.preferred_language
+            language=user.preferred_language,
+            user_id=chat.user_id,
+            chat_id=chat_id
         )
         
         # Create the AI response based on the analysis
-        ai_message = ChatMessageCreate(
+        ai_message = ChatMessage(
+            user_id=chat.user_id,
             sent_from=MessageSender.AI,
             type=message.type,
             text=response_text
         )
+        if not await chat_repo.add_messages(chat_id, [ai_message]):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found"
+            )
+    
+    return MessageResponse(chat_id=chat_id, message=new_message)
+
+@router.post("/{chat_id}/messages/stream")
+async def add_message_stream(
+    chat_id: str,
+    message: ChatMessageCreate,
+    db: AsyncSession = Depends(get_db),
+    gemini: GeminiAssistant = Depends(get_gemini_assistant)
+):
+    """
+    Add a message to a chat and stream the AI reply as Server-Sent Events
+    
+    Events, in order:
+    - message: the stored user message (MessageResponse JSON)
+    - token: a chunk of the AI reply text, repeated as Gemini produces it
+    - done: the stored AI reply (MessageResponse JSON), or null if no reply was generated
+    """
+    chat_repo = get_chat_repository()
+    is_user_message = message.sent_from == MessageSender.USER
+    
+    # Verify that the chat exists; only a user message needs recent history, for the AI reply
+    if is_user_message:
+        chat = await chat_repo.get_chat_tail(chat_id, settings.CHAT_CONTEXT_MAX_MESSAGES)
+    else:
+        chat = await chat_repo.get_chat(chat_id, with_messages=False)
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    
+    # Get the user to check preferred language
+    user_repo = UserRepository(db)
+    user = await user_repo.get_user_by_id(chat.user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Add the user message before streaming starts so errors can still be reported as HTTP errors.
+    # It is not held back for the reply: subscribers should see it while the reply streams.
+    new_message = ChatMessage(user_id=chat.user_id, **message.dict())
+    if not await chat_repo.add_messages(chat_id, [new_message]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found"
+        )
+    message_response = MessageResponse(chat_id=chat_id, message=new_message)
+    
+    # Once the client has the full reply, fold old messages into the summary if needed
+    background = None
+    if is_user_message:
+        formatted_chat_history, dropped_upto = build_chat_context(chat, [new_message])
+        if is_summary_stale(chat, dropped_upto):
+            background = BackgroundTask(refresh_chat_summary, chat_repo, gemini, chat, dropped_upto)
+    
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse_event("message", message_response.json())
         
-        # Add the AI response to the chat
-        await chat_repo.add_message(chat_id, ai_message, chat.user_id)
+        if not is_user_message:
+            yield _sse_event("done", "null")
+            return
+        
+        chunks = []
+        async for chunk in gemini.process_chat_stream(
+            chat_history=formatted_chat_history,
+            language=user.preferred_language,
+            user_id=chat.user_id,
+            chat_id=chat_id
+        ):
+            chunks.append(chunk)
+            yield _sse_event("token", chunk)
+        
+        # Store the finished AI response once the stream has ended
+        ai_message = ChatMessage(
+            user_id=chat.user_id,
+            sent_from=MessageSender.AI,
+            type=message.type,
+            text="".join(chunks).strip()
+        )
+        if await chat_repo.add_messages(chat_id, [ai_message]):
+            yield _sse_event("done", MessageResponse(chat_id=chat_id, message=ai_message).json())
+        else:
+            yield _sse_event("done", "null")
     
-    return message_response
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Disable proxy buffering so tokens reach slow clients immediately
+            "X-Accel-Buffering": "no",
+        },
+        background=background
+    )
 
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat(
     chat_id: str
 ):
     """Delete a chat"""
-    chat_repo = ChatRepository()
+    chat_repo = get_chat_repository()
     
     # Verify that the chat exists
     chat = await chat_repo.get_chat(chat_id)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, status
+from app.schemas.job import JobResponse
+from app.utils.job_queue import job_queue
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status of a background job, such as a document automation"""
+    job = await job_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
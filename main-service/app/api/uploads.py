@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, UploadFile, File, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.postgres import get_db
-from app.utils.file_storage import FileStorage
-from typing import Dict, Any
+from app.schemas.chat import MessageType
+from app.utils.file_storage import FileStorage, UploadTooLarge
+from app.utils.thumbnails import FORMATS, VARIANTS, thumbnails
+from typing import Dict, Any, Iterator, Optional, Tuple
+import mimetypes
 import os
+import re
 from urllib.parse import quote
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
@@ -12,13 +16,15 @@ file_storage = FileStorage()
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    type: Optional[MessageType] = Query(None, description="Kind of file, for its size limit; guessed from the content type if not given"),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Upload a document file
     
-    Returns a dict with the file details and document link
+    Returns a dict with the file details, size, SHA-256 and document link
     """
     if not file.filename:
         raise HTTPException(
@@ -28,30 +34,136 @@ async def upload_document(
         
     # Save the uploaded file
     try:
-        filename, _ = await file_storage.save_upload(file)
+        saved = await file_storage.save_upload(file, type)
         
         # Create a document link for client to reference
         # Format: #doc_{filename} - this will allow frontend to use the "#" notation
-        doc_reference = f"#doc_{filename}"
+        doc_reference = f"#doc_{saved.filename}"
+        
+        # Render previews of images and PDFs now rather than on the first chat view
+        background_tasks.add_task(thumbnails.pregenerate, saved.filename)
         
         # Return the document details
         return {
             "filename": file.filename,
             "content_type": file.content_type,
-            "doc_link": filename,  # The unique ID/filename to retrieve the file
+            "size": saved.size,
+            "sha256": saved.sha256,
+            "deduplicated": saved.deduplicated,
+            "doc_link": saved.filename,  # The unique ID/filename to retrieve the file
             "doc_reference": doc_reference  # The reference to use in chat
         }
         
+    except UploadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload file: {str(e)}"
         )
 
+# Uploaded files are never modified (a new upload gets a new name), so clients
+# may keep them indefinitely; private because they are personal documents
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Uploads are user content: browsers must use the declared content type
+# rather than sniffing one (e.g. HTML in a file sent as text/plain)
+NOSNIFF = {"X-Content-Type-Options": "nosniff"}
+
+# Bytes read at a time when serving part of a file
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# A single byte range; other Range headers are left to FileResponse
+RANGE_PATTERN = re.compile(r"bytes\s*=\s*(\d*)-(\d*)", re.IGNORECASE)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match or If-Range header value names the ETag"""
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The (first, last) byte of a single-range Range header, clipped to the file.
+
+    Returns None for headers this doesn't handle (several ranges, or not a
+    byte range), which FileResponse then serves as multipart or rejects with a
+    400; raises ValueError if it can't be satisfied.
+    """
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    if size == 0:
+        raise ValueError("empty file")
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(size - int(last), 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first and first < size:
+        return None
+    if first >= size:
+        raise ValueError("range starts after the end of the file")
+    return first, last
+
+def _content_disposition(filename: str) -> str:
+    """An attachment Content-Disposition, as FileResponse builds it"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+def _read_range(file_path: str, first: int, last: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+async def _download_variant(filename: str, variant: str, request: Request):
+    """Serve a preview of an image or PDF, as WebP if the client accepts it and JPEG otherwise"""
+    if variant not in VARIANTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown variant: {variant}"
+        )
+    image_format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    key = file_storage.derivative_key(filename, file_storage.get_metadata(filename))
+    etag = f'"{key}-{variant}-{image_format}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept", **NOSNIFF}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = await thumbnails.get(filename, variant, image_format)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No {variant} available for this file"
+        )
+    return FileResponse(path=path, media_type=FORMATS[image_format], headers=headers)
+
 @router.get("/{filename}")
-async def download_document(filename: str):
+async def download_document(filename: str, request: Request, variant: Optional[str] = Query(None)):
     """
     Download a document by its unique filename
+
+    Served with its original content type, a strong ETag (the content's
+    SHA-256, or its size and modification time for older files) and long-lived
+    caching. Supports If-None-Match (304) and single byte ranges (206), so
+    clients can revalidate cached files and seek in audio and video.
+
+    With ?variant=thumb, a small preview of an image or a PDF's first page
+    is served instead, rendered on first request if it isn't cached yet.
     """
     file_path = file_storage.get_file_path(filename)
     
@@ -61,13 +173,58 @@ async def download_document(filename: str):
             detail="File not found"
         )
     
-    # Get the original filename from metadata if available
-    # For now we'll just use the unique filename
-    # You could store original filenames in a database if needed
+    if variant:
+        return await _download_variant(filename, variant, request)
+    
+    stat_result = os.stat(file_path)
+    metadata = file_storage.get_metadata(filename) or {}
+    if metadata.get("sha256"):
+        etag = f'"{metadata["sha256"]}"'
+    else:
+        etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    media_type = metadata.get("content_type") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    # Full and partial responses carry the same headers
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": _content_disposition(metadata.get("filename") or filename),
+        **NOSNIFF,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        size = stat_result.st_size
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range:
+            first, last = byte_range
+            return StreamingResponse(
+                _read_range(file_path, first, last),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {first}-{last}/{size}",
+                    "Content-Length": str(last - first + 1),
+                }
+            )
+
     return FileResponse(
         path=file_path, 
-        filename=filename,  # This will be used for the download
-        media_type="application/octet-stream"
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result
     )
 
 @router.delete("/{filename}", status_code=status.HTTP_204_NO_CONTENT)
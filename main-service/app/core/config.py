@@ -26,10 +26,96 @@ class Settings(BaseSettings):
     MONGO_PASSWORD: str = os.getenv("MONGO_PASSWORD", "digicsc_password")
     MONGO_DB: str = os.getenv("MONGO_DB", "digicsc_chat_db")
     MONGO_URL: str = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_SERVER}:{MONGO_PORT}/{MONGO_DB}?authSource=admin"
+    # Where chat messages live: "embedded" (array in the chat document) or
+    # "collection" (one document per message in chat_messages). Existing chats
+    # are not migrated when this is changed.
+    CHAT_MESSAGE_LAYOUT: str = os.getenv("CHAT_MESSAGE_LAYOUT", "embedded")
+    # With the "collection" layout, seconds after which a sequence number that
+    # was reserved but never written (failed insert, crashed process) is skipped
+    # by message fetches instead of holding back the messages after it
+    CHAT_SEQ_GAP_TIMEOUT: int = int(os.getenv("CHAT_SEQ_GAP_TIMEOUT", "30"))
+    
+    # Redis Configuration
+    REDIS_HOST: str = os.getenv("REDIS_HOST", "localhost")
+    REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
+    REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    # Seconds; keep these short so a Redis outage degrades to in-memory state quickly
+    REDIS_SOCKET_TIMEOUT: float = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+    REDIS_CONNECT_TIMEOUT: float = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1.0"))
+    # Seconds an idle document conversation state is kept
+    CONVERSATION_STATE_TTL: int = int(os.getenv("CONVERSATION_STATE_TTL", "3600"))
+    
+    # Chat message fan-out; enable Redis pub/sub when running more than one worker
+    CHAT_BROKER_USE_REDIS: bool = os.getenv("CHAT_BROKER_USE_REDIS", "false").lower() == "true"
+    CHAT_BROKER_QUEUE_SIZE: int = int(os.getenv("CHAT_BROKER_QUEUE_SIZE", "100"))
     
     # Google Gemini API key
     GOOGLE_GEMINI_API_KEY: str = os.getenv("GOOGLE_GEMINI_API_KEY", "")
 
+    # Classify new requests and draft the reply with one structured Gemini call
+    # instead of separate freelancer, automation and response calls
+    GEMINI_ROUTER_MODE: bool = os.getenv("GEMINI_ROUTER_MODE", "true").lower() == "true"
+    
+    # Local keyword classifier that answers confident intents without a Gemini call
+    INTENT_CLASSIFIER_ENABLED: bool = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+    INTENT_CLASSIFIER_THRESHOLD: float = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.8"))
+    
+    # Outbound Gemini calls: concurrent calls, sustained rate and burst matching
+    # the API quota, and retries shared by all calls of one chat turn
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+    GEMINI_REQUESTS_PER_MINUTE: float = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "1000"))
+    GEMINI_BURST: int = int(os.getenv("GEMINI_BURST", "20"))
+    GEMINI_RETRY_BUDGET: int = int(os.getenv("GEMINI_RETRY_BUDGET", "2"))
+    
+    # Cache of Gemini results, in process memory and Redis: classification calls
+    # and answers to context-free questions (the first message of a chat)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    LLM_CACHE_CLASSIFICATION_TTL: int = int(os.getenv("LLM_CACHE_CLASSIFICATION_TTL", "86400"))
+    LLM_CACHE_FAQ_TTL: int = int(os.getenv("LLM_CACHE_FAQ_TTL", "3600"))
+    
+    # Background jobs for the document automations: workers per process (0 to
+    # leave them to `python -m app.worker`), seconds between polls for jobs
+    # queued by other processes, and seconds job status is kept
+    AUTOMATION_WORKERS: int = int(os.getenv("AUTOMATION_WORKERS", "2"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_TTL: int = int(os.getenv("JOB_TTL", "86400"))
+    
+    # Chrome drivers shared by the automations: drivers at most, jobs served
+    # by one driver before it's replaced, headless mode, and drivers started
+    # ahead of the first job by processes that run automation workers
+    WEBDRIVER_POOL_SIZE: int = int(os.getenv("WEBDRIVER_POOL_SIZE", "2"))
+    WEBDRIVER_MAX_USES: int = int(os.getenv("WEBDRIVER_MAX_USES", "20"))
+    WEBDRIVER_HEADLESS: bool = os.getenv("WEBDRIVER_HEADLESS", "true").lower() == "true"
+    WEBDRIVER_PREWARM: int = int(os.getenv("WEBDRIVER_PREWARM", "1"))
+    
+    # Applicants read from one bulk submission file; later rows are ignored
+    BATCH_MAX_ROWS: int = int(os.getenv("BATCH_MAX_ROWS", "1000"))
+    
+    # Largest accepted upload per message type, in MB
+    UPLOAD_MAX_MB_IMAGE: int = int(os.getenv("UPLOAD_MAX_MB_IMAGE", "10"))
+    UPLOAD_MAX_MB_PDF: int = int(os.getenv("UPLOAD_MAX_MB_PDF", "20"))
+    UPLOAD_MAX_MB_AUDIO: int = int(os.getenv("UPLOAD_MAX_MB_AUDIO", "25"))
+    UPLOAD_MAX_MB_VIDEO: int = int(os.getenv("UPLOAD_MAX_MB_VIDEO", "100"))
+    UPLOAD_MAX_MB_FILE: int = int(os.getenv("UPLOAD_MAX_MB_FILE", "20"))
+    # Store each distinct upload once, keyed by its SHA-256, with every doc_link
+    # a hard link to it; files saved before this was enabled keep working
+    UPLOAD_CONTENT_ADDRESSED: bool = os.getenv("UPLOAD_CONTENT_ADDRESSED", "true").lower() == "true"
+    
+    # Previews of uploaded images and PDFs: worker processes rendering them,
+    # longest side in pixels, and JPEG/WebP quality
+    THUMBNAIL_WORKERS: int = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+    THUMBNAIL_MAX_SIZE: int = int(os.getenv("THUMBNAIL_MAX_SIZE", "320"))
+    THUMBNAIL_QUALITY: int = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+    
+    # Gemini conversation context: recent messages are sent verbatim within the
+    # token budget, older ones are folded into a rolling summary on the chat
+    CHAT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+    CHAT_CONTEXT_MAX_MESSAGES: int = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "12"))
+    # Refresh the summary once this many messages have dropped out of the verbatim window
+    CHAT_SUMMARY_REFRESH_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_REFRESH_MESSAGES", "6"))
+
     # Supported languages
     SUPPORTED_LANGUAGES: List[str] = ["english", "hindi", "kumaoni", "gharwali"]
     DEFAULT_LANGUAGE: str = "english"
@@ -0,0 +1,87 @@
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+# Indexes the repositories rely on, per collection. Add new ones here rather
+# than creating them by hand so every environment converges on the same set.
+MONGO_INDEXES: Dict[str, List[IndexModel]] = {
+    "chats": [
+        IndexModel([("chat_id", ASCENDING)], name="chat_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING)], name="user_id_updated_at"),
+    ],
+    "chat_messages": [
+        IndexModel([("chat_id", ASCENDING), ("seq", ASCENDING)], name="chat_id_seq_unique", unique=True),
+    ],
+}
+
+def _index_signature(spec: dict) -> tuple:
+    """Key pattern and uniqueness of an index, the parts that matter to the repositories"""
+    # MongoDB may report directions as doubles (1.0), declarations use ints
+    key = tuple((field, int(direction) if isinstance(direction, float) else direction) for field, direction in spec["key"])
+    return key, bool(spec.get("unique", False))
+
+async def ensure_indexes(db) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Create missing indexes and report drift from MONGO_INDEXES
+    
+    Safe to run on every boot: indexes that already exist as declared are left
+    alone. Indexes that exist with a different definition (including the same
+    keys with other options under another name), or that are not declared at
+    all, are reported but never dropped automatically. Each missing index is
+    created on its own, so one that fails (e.g. duplicate keys for a unique
+    index) doesn't stop the others; failures are reported as "failed".
+    
+    Args:
+        db: The MongoDB database
+        
+    Returns:
+        Per collection, lists of "created", "failed", "drift" and "unmanaged" index names
+    """
+    report = {}
+    for collection_name, declared_indexes in MONGO_INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        existing_by_signature = {_index_signature(spec): name for name, spec in existing.items()}
+        existing_by_key = {_index_signature(spec)[0]: name for name, spec in existing.items()}
+        
+        created, failed, drift = [], [], []
+        to_create = []
+        aliased = set()
+        for index in declared_indexes:
+            spec = index.document
+            name = spec["name"]
+            signature = _index_signature({"key": list(spec["key"].items()), "unique": spec.get("unique")})
+            
+            if name in existing:
+                if _index_signature(existing[name]) != signature:
+                    drift.append(name)
+            elif signature in existing_by_signature:
+                # Same index under another name; creating it again would fail
+                aliased.add(existing_by_signature[signature])
+                drift.append(f"{name} (exists as {existing_by_signature[signature]})")
+            elif signature[0] in existing_by_key:
+                # Same keys with other options; MongoDB refuses a second index on them
+                aliased.add(existing_by_key[signature[0]])
+                drift.append(f"{name} (exists with other options as {existing_by_key[signature[0]]})")
+            else:
+                to_create.append(index)
+        
+        for index in to_create:
+            try:
+                created += await collection.create_indexes([index])
+            except PyMongoError as e:
+                failed.append(index.document["name"])
+                print(f"Error creating MongoDB index {collection_name}.{index.document['name']}: {e}")
+        
+        declared_names = {index.document["name"] for index in declared_indexes} | aliased
+        unmanaged = [name for name in existing if name != "_id_" and name not in declared_names]
+        
+        report[collection_name] = {"created": created, "failed": failed, "drift": drift, "unmanaged": unmanaged}
+        for name in created:
+            print(f"Created MongoDB index {collection_name}.{name}")
+        for name in drift:
+            print(f"Warning: MongoDB index {collection_name}.{name} differs from its declaration")
+        for name in unmanaged:
+            print(f"Warning: MongoDB index {collection_name}.{name} is not declared in MONGO_INDEXES")
+    
+    return report
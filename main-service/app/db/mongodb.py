@@ -1,15 +1,24 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.db.indexes import ensure_indexes
 
 mongodb_client = None
 mongodb = None
+# Result of the last index reconciliation, see app.db.indexes.ensure_indexes
+index_report = {}
 
 async def connect_to_mongo():
-    """Create MongoDB connection"""
-    global mongodb_client, mongodb
+    """Create MongoDB connection and make sure the required indexes exist"""
+    global mongodb_client, mongodb, index_report
     mongodb_client = AsyncIOMotorClient(settings.MONGO_URL)
     mongodb = mongodb_client[settings.MONGO_DB]
     
+    try:
+        index_report = await ensure_indexes(mongodb)
+    except Exception as e:
+        # Queries still work without indexes, only slower; don't refuse to boot
+        print(f"Warning: Could not reconcile MongoDB indexes ({str(e)})")
+    
 async def close_mongo_connection():
     """Close MongoDB connection"""
     global mongodb_client
@@ -0,0 +1,55 @@
+import redis.asyncio as aioredis
+from app.core.config import settings
+
+redis_client = None
+
+# Seconds between PINGs on an idle pub/sub connection
+PUBSUB_HEALTH_CHECK_INTERVAL = 30
+
+async def connect_to_redis():
+    """Create the pooled Redis client, leaving it unset if Redis is unreachable"""
+    global redis_client
+    pool = aioredis.ConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+    )
+    client = aioredis.Redis(connection_pool=pool)
+    try:
+        await client.ping()
+        redis_client = client
+        print("Connected to Redis")
+    except Exception as e:
+        print(f"Warning: Could not connect to Redis ({str(e)}). Falling back to in-memory storage.")
+        await client.aclose(close_connection_pool=True)
+
+async def close_redis_connection():
+    """Close the Redis client and its connection pool"""
+    global redis_client
+    if redis_client:
+        await redis_client.aclose(close_connection_pool=True)
+        redis_client = None
+
+def create_pubsub_client():
+    """
+    Create a Redis client for a long-lived pub/sub subscription.
+
+    Separate from the shared client because its short socket timeout would
+    abort a subscriber waiting on an idle channel; this one waits indefinitely
+    and relies on health checks to notice dead connections. The caller closes it.
+    """
+    return aioredis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        socket_timeout=None,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+        health_check_interval=PUBSUB_HEALTH_CHECK_INTERVAL,
+    )
+
+def get_redis():
+    """Get the Redis client, or None if Redis is not available"""
+    return redis_client
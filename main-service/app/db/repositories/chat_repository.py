@@ -1,11 +1,29 @@
+from app.core.config import settings
 from app.db.mongodb import get_mongo_db
-from app.schemas.chat import Chat, ChatMessage, ChatCreate, MessageResponse, ChatMessageCreate
-from datetime import datetime
-from typing import List, Optional
+from app.utils.chat_broker import chat_broker
+from app.schemas.chat import Chat, ChatMessage, ChatCreate, MessageResponse, ChatMessageCreate, ChatSummary
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 import uuid
 
+# Number of characters of the last message kept for chat list previews
+PREVIEW_LENGTH = 120
+
+def _message_preview(message: ChatMessage) -> Dict[str, Any]:
+    """Build the last-message preview stored on the chat document"""
+    return {
+        "message_id": message.message_id,
+        "sent_from": message.sent_from.value,
+        "type": message.type.value,
+        "text": message.text[:PREVIEW_LENGTH],
+        "created_at": message.created_at
+    }
+
 class ChatRepository:
+    """Chat storage with messages embedded as an array in the chat document"""
+    
     def __init__(self):
         self.db = get_mongo_db()
         self.collection = self.db.chats
@@ -24,27 +42,123 @@ class ChatRepository:
         await self.collection.insert_one(chat.dict())
         return chat
     
-    async def get_chat(self, chat_id: str) -> Optional[Chat]:
-        """Get a chat by its ID"""
-        chat_data = await self.collection.find_one({"chat_id": chat_id})
+    def _number_messages(self, chat_id: str, messages: List[Dict[str, Any]], start: int = 0) -> List[ChatMessage]:
+        """
+        Build ChatMessage objects and assign their sequence numbers.
+        
+        Messages are only ever appended to the embedded array, so a message's
+        sequence number is its 1-based position in it. Messages stored before
+        message IDs existed get an ID derived from that position.
+        """
+        numbered = []
+        for index, message_data in enumerate(messages):
+            message = ChatMessage(**message_data)
+            message.seq = start + index + 1
+            if not message.message_id:
+                message.message_id = f"{chat_id}-{message.seq}"
+            numbered.append(message)
+        return numbered
+    
+    async def get_chat(self, chat_id: str, with_messages: bool = True) -> Optional[Chat]:
+        """Get a chat by its ID, optionally without loading its messages"""
+        projection = None if with_messages else {"messages": 0}
+        chat_data = await self.collection.find_one({"chat_id": chat_id}, projection)
         if not chat_data:
             return None
+        chat_data["messages"] = self._number_messages(chat_id, chat_data.get("messages", []))
+        return Chat(**chat_data)
+    
+    async def chat_exists(self, chat_id: str) -> bool:
+        """Check whether a chat exists without loading its messages"""
+        chat_data = await self.collection.find_one({"chat_id": chat_id}, {"_id": 1})
+        return chat_data is not None
+    
+    async def get_chat_tail(self, chat_id: str, limit: int = 20) -> Optional[Chat]:
+        """Get a chat with only its last `limit` messages loaded"""
+        cursor = self.collection.aggregate([
+            {"$match": {"chat_id": chat_id}},
+            {"$project": {
+                "_id": 0,
+                "chat_id": 1,
+                "user_id": 1,
+                "context_summary": 1,
+                "context_summary_seq": 1,
+                "created_at": 1,
+                "updated_at": 1,
+                "messages": {"$slice": ["$messages", -limit]},
+                "message_count": {"$size": "$messages"}
+            }}
+        ])
+        results = await cursor.to_list(length=1)
+        if not results:
+            return None
+        chat_data = results[0]
+        messages = chat_data["messages"]
+        chat_data["messages"] = self._number_messages(chat_id, messages, start=chat_data["message_count"] - len(messages))
         return Chat(**chat_data)
     
+    async def update_context_summary(self, chat_id: str, summary: str, summary_seq: int) -> bool:
+        """Store a chat's rolling summary unless a summary covering more messages was stored meanwhile"""
+        result = await self.collection.update_one(
+            {
+                "chat_id": chat_id,
+                "$or": [
+                    {"context_summary_seq": {"$lt": summary_seq}},
+                    {"context_summary_seq": {"$exists": False}}
+                ]
+            },
+            {"$set": {"context_summary": summary, "context_summary_seq": summary_seq}}
+        )
+        return result.modified_count > 0
+    
     async def list_user_chats(self, user_id: int) -> List[Chat]:
         """Get all chats for a specific user"""
         cursor = self.collection.find({"user_id": user_id})
         chats = []
         async for chat_data in cursor:
+            chat_data["messages"] = self._number_messages(chat_data["chat_id"], chat_data.get("messages", []))
             chats.append(Chat(**chat_data))
         return chats
     
+    async def list_user_chat_summaries(self, user_id: int, limit: int = 20, before: Optional[Tuple[datetime, str]] = None) -> List[ChatSummary]:
+        """
+        Get a page of a user's chats without their messages, most recently updated first
+        
+        Args:
+            user_id: The user whose chats to list
+            limit: Maximum number of chats to return
+            before: (updated_at, chat_id) of the last chat of the previous page
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if before:
+            updated_at, chat_id = before
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "chat_id": {"$lt": chat_id}}
+            ]
+        
+        # Chats written before previews existed fall back to the embedded messages array
+        projection = {
+            "_id": 0,
+            "chat_id": 1,
+            "user_id": 1,
+            "created_at": 1,
+            "updated_at": 1,
+            "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+            "last_message": {"$ifNull": ["$last_message", {"$arrayElemAt": ["$messages", -1]}]}
+        }
+        cursor = self.collection.find(query, projection).sort([("updated_at", -1), ("chat_id", -1)]).limit(limit)
+        
+        summaries = []
+        async for chat_data in cursor:
+            last_message = chat_data.get("last_message")
+            if last_message:
+                last_message["text"] = last_message["text"][:PREVIEW_LENGTH]
+            summaries.append(ChatSummary(**chat_data))
+        return summaries
+    
     async def add_message(self, chat_id: str, message_create: ChatMessageCreate, user_id: int) -> Optional[MessageResponse]:
         """Add a message to an existing chat"""
-        chat = await self.get_chat(chat_id)
-        if not chat:
-            return None
-        
         # Create the new message
         new_message = ChatMessage(
             user_id=user_id,
@@ -56,20 +170,54 @@ class ChatRepository:
             created_at=datetime.now()
         )
         
-        # Update the chat with the new message and updated timestamp
-        await self.collection.update_one(
-            {"chat_id": chat_id},
-            {
-                "$push": {"messages": new_message.dict()},
-                "$set": {"updated_at": datetime.now()}
-            }
-        )
+        if not await self.add_messages(chat_id, [new_message]):
+            return None
         
         return MessageResponse(
             chat_id=chat_id,
             message=new_message
         )
     
+    async def add_messages(self, chat_id: str, messages: List[ChatMessage]) -> bool:
+        """
+        Append several messages to a chat in a single write
+        
+        The messages get their message_id and seq assigned in place and are
+        pushed to clients subscribed to the chat.
+        
+        Returns:
+            False if the chat doesn't exist
+        """
+        for message in messages:
+            message.message_id = message.message_id or str(uuid.uuid4())
+        
+        last_seq = await self._append_messages(chat_id, messages)
+        if last_seq is None:
+            return False
+        
+        for offset, message in enumerate(messages):
+            message.seq = last_seq - len(messages) + offset + 1
+            # Push the new message to clients subscribed to this chat
+            await chat_broker.publish(chat_id, message)
+        return True
+    
+    async def _append_messages(self, chat_id: str, messages: List[ChatMessage]) -> Optional[int]:
+        """Store messages, returning the sequence number of the last one or None if the chat doesn't exist"""
+        # Append the messages and read back the array length in the same round trip;
+        # the length is the last new message's sequence number
+        chat_data = await self.collection.find_one_and_update(
+            {"chat_id": chat_id},
+            {
+                "$push": {"messages": {"$each": [message.dict(exclude={"seq"}) for message in messages]}},
+                "$set": {"updated_at": datetime.now(), "last_message": _message_preview(messages[-1])}
+            },
+            projection={"_id": 0, "message_count": {"$size": "$messages"}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not chat_data:
+            return None
+        return chat_data["message_count"]
+    
     async def delete_chat(self, chat_id: str) -> bool:
         """Delete a chat by its ID"""
         result = await self.collection.delete_one({"chat_id": chat_id})
@@ -80,4 +228,186 @@ class ChatRepository:
         chat = await self.get_chat(chat_id)
         if not chat:
             return []
-        return chat.messages
\ No newline at end of file
+        return chat.messages
+    
+    async def get_messages_after(self, chat_id: str, after: int = 0, limit: int = 50) -> Optional[Tuple[List[ChatMessage], int]]:
+        """
+        Get up to `limit` messages with a sequence number greater than `after`
+        
+        Only the requested slice of the messages array is sent back by MongoDB.
+        
+        Returns:
+            Tuple of (messages, total message count), or None if the chat doesn't exist
+        """
+        cursor = self.collection.aggregate([
+            {"$match": {"chat_id": chat_id}},
+            {"$project": {
+                "_id": 0,
+                "messages": {"$slice": ["$messages", after, limit]},
+                "message_count": {"$size": "$messages"}
+            }}
+        ])
+        results = await cursor.to_list(length=1)
+        if not results:
+            return None
+        return self._number_messages(chat_id, results[0]["messages"], start=after), results[0]["message_count"]
+    
+    async def get_recent_messages(self, chat_id: str, limit: int = 20) -> List[ChatMessage]:
+        """Get the last `limit` messages of a chat, oldest first"""
+        cursor = self.collection.aggregate([
+            {"$match": {"chat_id": chat_id}},
+            {"$project": {
+                "_id": 0,
+                "messages": {"$slice": ["$messages", -limit]},
+                "message_count": {"$size": "$messages"}
+            }}
+        ])
+        results = await cursor.to_list(length=1)
+        if not results:
+            return []
+        messages = results[0]["messages"]
+        return self._number_messages(chat_id, messages, start=results[0]["message_count"] - len(messages))
+
+class MessageCollectionChatRepository(ChatRepository):
+    """
+    Chat storage with one document per message in a separate collection
+    
+    Messages are keyed by (chat_id, seq), so appending a message or reading the
+    latest ones costs the same however long the chat is, and chat documents stay
+    small instead of growing towards MongoDB's 16 MB document limit. The chat
+    document keeps a message_count counter used to hand out sequence numbers.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.messages_collection = self.db.chat_messages
+    
+    async def create_chat(self, chat_create: ChatCreate) -> Chat:
+        """Create a new chat for a user"""
+        chat = Chat(
+            chat_id=str(uuid.uuid4()),
+            user_id=chat_create.user_id,
+            messages=[],
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        )
+        
+        chat_data = chat.dict(exclude={"messages"})
+        chat_data["message_count"] = 0
+        await self.collection.insert_one(chat_data)
+        return chat
+    
+    async def _find_messages(self, query: Dict[str, Any], sort_direction: int = 1, limit: int = 0) -> List[ChatMessage]:
+        """Load message documents matching a query, sorted by sequence number"""
+        cursor = self.messages_collection.find(query, {"_id": 0, "chat_id": 0}).sort("seq", sort_direction).limit(limit)
+        return [ChatMessage(**message_data) async for message_data in cursor]
+    
+    async def get_chat(self, chat_id: str, with_messages: bool = True) -> Optional[Chat]:
+        """Get a chat by its ID, optionally without loading its messages"""
+        chat_data = await self.collection.find_one({"chat_id": chat_id}, {"_id": 0})
+        if not chat_data:
+            return None
+        chat_data["messages"] = await self._find_messages({"chat_id": chat_id}) if with_messages else []
+        return Chat(**chat_data)
+    
+    async def get_chat_tail(self, chat_id: str, limit: int = 20) -> Optional[Chat]:
+        """Get a chat with only its last `limit` messages loaded"""
+        chat_data = await self.collection.find_one({"chat_id": chat_id}, {"_id": 0})
+        if not chat_data:
+            return None
+        chat_data["messages"] = await self.get_recent_messages(chat_id, limit)
+        return Chat(**chat_data)
+    
+    async def list_user_chats(self, user_id: int) -> List[Chat]:
+        """Get all chats for a specific user"""
+        chats_data = await self.collection.find({"user_id": user_id}, {"_id": 0}).to_list(length=None)
+        
+        # Load the messages of all chats in one query and group them per chat
+        messages_by_chat: Dict[str, List[ChatMessage]] = {chat_data["chat_id"]: [] for chat_data in chats_data}
+        cursor = self.messages_collection.find(
+            {"chat_id": {"$in": list(messages_by_chat)}}, {"_id": 0}
+        ).sort([("chat_id", 1), ("seq", 1)])
+        async for message_data in cursor:
+            messages_by_chat[message_data.pop("chat_id")].append(ChatMessage(**message_data))
+        
+        return [Chat(**chat_data, messages=messages_by_chat[chat_data["chat_id"]]) for chat_data in chats_data]
+    
+    async def _append_messages(self, chat_id: str, messages: List[ChatMessage]) -> Optional[int]:
+        """Store messages, returning the sequence number of the last one or None if the chat doesn't exist"""
+        # Reserve sequence numbers for the messages on the chat document
+        chat_data = await self.collection.find_one_and_update(
+            {"chat_id": chat_id},
+            {
+                "$inc": {"message_count": len(messages)},
+                "$set": {"updated_at": datetime.now(), "last_message": _message_preview(messages[-1])}
+            },
+            projection={"_id": 0, "message_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not chat_data:
+            return None
+        
+        last_seq = chat_data["message_count"]
+        first_seq = last_seq - len(messages) + 1
+        try:
+            await self.messages_collection.insert_many([
+                {**message.dict(), "chat_id": chat_id, "seq": first_seq + offset}
+                for offset, message in enumerate(messages)
+            ])
+        except Exception:
+            # Give the numbers back unless later messages have reserved theirs;
+            # otherwise fetches skip the gap once CHAT_SEQ_GAP_TIMEOUT has passed
+            await self.collection.update_one(
+                {"chat_id": chat_id, "message_count": last_seq},
+                {"$inc": {"message_count": -len(messages)}}
+            )
+            raise
+        return last_seq
+    
+    async def delete_chat(self, chat_id: str) -> bool:
+        """Delete a chat and its messages"""
+        result = await self.collection.delete_one({"chat_id": chat_id})
+        if result.deleted_count == 0:
+            return False
+        await self.messages_collection.delete_many({"chat_id": chat_id})
+        return True
+    
+    async def get_messages_after(self, chat_id: str, after: int = 0, limit: int = 50) -> Optional[Tuple[List[ChatMessage], int]]:
+        """
+        Get up to `limit` messages with a sequence number greater than `after`
+        
+        Sequence numbers are reserved before the messages are written, so a
+        later message can be stored while an earlier one is still being
+        inserted. The result stops at the first missing number, so clients
+        advancing their cursor to the last returned message never step over
+        one; a number still missing after CHAT_SEQ_GAP_TIMEOUT is skipped.
+        
+        Returns:
+            Tuple of (messages, total message count), or None if the chat doesn't exist
+        """
+        chat_data = await self.collection.find_one({"chat_id": chat_id}, {"_id": 0, "message_count": 1})
+        if not chat_data:
+            return None
+        messages = await self._find_messages({"chat_id": chat_id, "seq": {"$gt": after}}, limit=limit)
+        
+        settled_before = datetime.now() - timedelta(seconds=settings.CHAT_SEQ_GAP_TIMEOUT)
+        contiguous = []
+        expected_seq = after + 1
+        for message in messages:
+            if message.seq != expected_seq and message.created_at > settled_before:
+                break
+            contiguous.append(message)
+            expected_seq = message.seq + 1
+        return contiguous, chat_data.get("message_count", 0)
+    
+    async def get_recent_messages(self, chat_id: str, limit: int = 20) -> List[ChatMessage]:
+        """Get the last `limit` messages of a chat, oldest first"""
+        messages = await self._find_messages({"chat_id": chat_id}, sort_direction=-1, limit=limit)
+        messages.reverse()
+        return messages
+
+def get_chat_repository() -> ChatRepository:
+    """Get the chat repository for the configured message layout"""
+    if settings.CHAT_MESSAGE_LAYOUT == "collection":
+        return MessageCollectionChatRepository()
+    return ChatRepository()
@@ -1,11 +1,42 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from app.api import users, chats, uploads, call
+from fastapi.responses import JSONResponse
+from app.api import users, chats, uploads, call, jobs, batches
 from app.core.config import settings
 from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.redis import connect_to_redis, close_redis_connection
+from app.schemas.chat import MessageType
+from app.utils.chat_broker import chat_broker
+from app.utils.gemini_assistant import init_gemini_assistant
+from app.utils.file_storage import PublicStaticFiles, max_upload_size
+from app.utils.job_queue import job_queue
+from app.utils.thumbnails import thumbnails
+from app.utils.webdriver_pool import webdriver_pool
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up shared clients on startup and close them on shutdown"""
+    await connect_to_mongo()
+    await connect_to_redis()
+    await chat_broker.connect()
+    await init_gemini_assistant()
+    await job_queue.start(settings.AUTOMATION_WORKERS)
+    if settings.AUTOMATION_WORKERS:
+        # Start browsers in the background so startup doesn't wait on Chrome
+        prewarm = asyncio.create_task(asyncio.to_thread(webdriver_pool.prewarm, settings.WEBDRIVER_PREWARM))
+    yield
+    await job_queue.close()
+    if settings.AUTOMATION_WORKERS:
+        await prewarm
+        await asyncio.to_thread(webdriver_pool.close)
+    thumbnails.close()
+    await chat_broker.close()
+    await close_redis_connection()
+    await close_mongo_connection()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 # Set up CORS middleware
 app.add_middleware(
@@ -16,24 +47,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Room for multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse uploads whose declared length is over the size limit before the
+    body is read; the exact limit is applied again while the file is saved.
+    """
+    if request.method == "POST" and request.url.path.rstrip("/") == f"{settings.API_V1_STR}/uploads":
+        try:
+            message_type = MessageType(request.query_params["type"]) if "type" in request.query_params else None
+        except ValueError:
+            message_type = None
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_upload_size(message_type) + MULTIPART_OVERHEAD:
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": "Upload is over the size limit"}
+            )
+    return await call_next(request)
+
 # Include API routers
 app.include_router(users.router, prefix=settings.API_V1_STR)
 app.include_router(chats.router, prefix=settings.API_V1_STR)
 app.include_router(uploads.router, prefix=settings.API_V1_STR)
 app.include_router(call.router, prefix=settings.API_V1_STR)
+app.include_router(jobs.router, prefix=settings.API_V1_STR)
+app.include_router(batches.router, prefix=settings.API_V1_STR)
 
 
-# Mount static files for direct access to uploaded files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-
-# MongoDB connection events
-@app.on_event("startup")
-async def startup_db_client():
-    await connect_to_mongo()
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    await close_mongo_connection()
+# Mount static files for direct access to uploaded files (but not the blobs,
+# metadata and previews stored next to them)
+app.mount("/static", PublicStaticFiles(directory="app/static"), name="static")
 
 @app.get("/")
 async def root():
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+from enum import Enum
+
+class BatchStatus(str, Enum):
+    PROCESSING = "processing"
+    FINISHED = "finished"
+
+class BatchRowResponse(BaseModel):
+    # Line of the applicant in the uploaded file, counting data rows from 1
+    row: int
+    document_type: Optional[str] = None
+    name: Optional[str] = None
+    job_id: Optional[str] = None
+    # "rejected" for rows that failed validation, otherwise the job status
+    status: str
+    errors: List[str] = []
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    status: BatchStatus
+    user_id: Optional[int] = None
+    total: int
+    # Rows per status, e.g. {"rejected": 2, "queued": 40, "completed": 8}
+    counts: Dict[str, int]
+    # Completed applications per minute since the batch was submitted
+    applications_per_minute: Optional[float] = None
+    # True if rows past BATCH_MAX_ROWS were not read
+    truncated: bool = False
+    created_at: datetime
+    rows: List[BatchRowResponse]
@@ -18,6 +18,9 @@ class MessageType(str, Enum):
     FILE = "file"
 
 class ChatMessage(BaseModel):
+    # Stable identifier and 1-based position of the message within its chat; assigned by the repository
+    message_id: Optional[str] = None
+    seq: Optional[int] = None
     user_id: int
     sent_from: MessageSender
     type: MessageType 
@@ -42,17 +45,16 @@ class Chat(BaseModel):
     chat_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: int
     messages: List[ChatMessage] = []
+    # Rolling summary of the messages up to and including seq context_summary_seq,
+    # used in place of those messages when building Gemini context
+    context_summary: Optional[str] = None
+    context_summary_seq: int = 0
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     
     def format_chat_history_for_gemini(self) -> str:
         """Format the entire chat history in a conversational format for Gemini."""
-        formatted_chat = ""
-        for msg in self.messages:
-            if msg.type == MessageType.TEXT:  # Only include text messages
-                role = "User" if msg.sent_from == MessageSender.USER else "AI" if msg.sent_from == MessageSender.AI else "Freelancer"
-                formatted_chat += f"{role}: {msg.text}\n\n"
-        return formatted_chat
+        return format_messages_for_gemini(self.messages)
 
 class ChatCreate(BaseModel):
     user_id: int
@@ -66,17 +68,39 @@ class ChatResponse(BaseModel):
     
     def format_chat_history_for_gemini(self) -> str:
         """Format the entire chat history in a conversational format for Gemini."""
-        formatted_chat = ""
-        for msg in self.messages:
-            if msg.type == MessageType.TEXT:  # Only include text messages
-                role = "User" if msg.sent_from == MessageSender.USER else "AI" if msg.sent_from == MessageSender.AI else "Freelancer"
-                formatted_chat += f"{role}: {msg.text}\n\n"
-        return formatted_chat
+        return format_messages_for_gemini(self.messages)
 
 class MessageResponse(BaseModel):
     message: ChatMessage
     chat_id: str
 
+class ChatMessagePreview(BaseModel):
+    message_id: Optional[str] = None
+    sent_from: MessageSender
+    type: MessageType
+    text: str
+    created_at: datetime
+
+class ChatSummary(BaseModel):
+    chat_id: str
+    user_id: int
+    message_count: int
+    last_message: Optional[ChatMessagePreview] = None
+    created_at: datetime
+    updated_at: datetime
+
+class ChatSummaryPage(BaseModel):
+    chats: List[ChatSummary]
+    # Pass as `cursor` to fetch the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+
+class MessageListResponse(BaseModel):
+    chat_id: str
+    messages: List[ChatMessage]
+    # Pass as `after` to fetch the messages following this page
+    next_cursor: int
+    has_more: bool
+
 def format_messages_for_gemini(messages: List[ChatMessage]) -> str:
     """
     Format a list of chat messages into a conversational format for Gemini.
@@ -92,9 +116,5 @@ def format_messages_for_gemini(messages: List[ChatMessage]) -> str:
     Returns:
         Formatted conversation string
     """
-    formatted_chat = ""
-    for msg in messages:
-        if msg.type == MessageType.TEXT:  # Only include text messages
-            role = "User" if msg.sent_from == MessageSender.USER else "AI" if msg.sent_from == MessageSender.AI else "Freelancer"
-            formatted_chat += f"{role}: {msg.text}\n\n"
-    return formatted_chat
\ No newline at end of file
+    # Only include text messages
+    return "".join(f"{msg.format_for_gemini()}\n\n" for msg in messages if msg.type == MessageType.TEXT)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class JobResponse(BaseModel):
+    job_id: str
+    type: str
+    # Human-readable name of what the job does, e.g. "PAN card"
+    label: str
+    status: JobStatus
+    chat_id: Optional[str] = None
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -0,0 +1,301 @@
+import asyncio
+import codecs
+import csv
+import inspect
+import json
+import re
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import UploadFile
+from app.core.config import settings
+from app.db.redis import get_redis
+from app.schemas.batch import BatchStatus
+from app.schemas.job import JobStatus
+from app.utils.gemini_assistant import AutomationType, FIELD_EXTRACTORS
+from app.utils.job_queue import job_queue
+
+BATCH_PREFIX = "applicant_batch:"
+
+# Bytes read from the upload at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# Status of rows that failed validation and were never queued
+REJECTED = "rejected"
+
+# Names of the documents, as used in job labels
+DOCUMENT_LABELS = {
+    AutomationType.PAN_CARD.value: "PAN card",
+    AutomationType.VOTER_ID.value: "Voter ID",
+    AutomationType.LEARNER_LICENSE.value: "Learner License",
+}
+
+# Other ways operators write the document type
+DOCUMENT_TYPE_ALIASES = {
+    "pan": AutomationType.PAN_CARD.value,
+    "voter": AutomationType.VOTER_ID.value,
+    "voter_card": AutomationType.VOTER_ID.value,
+    "epic": AutomationType.VOTER_ID.value,
+    "learner_licence": AutomationType.LEARNER_LICENSE.value,
+    "learners_license": AutomationType.LEARNER_LICENSE.value,
+    "learners_licence": AutomationType.LEARNER_LICENSE.value,
+    "ll": AutomationType.LEARNER_LICENSE.value,
+}
+
+# Other column names for the applicant fields, after normalisation
+FIELD_ALIASES = {
+    "type": "document_type",
+    "document": "document_type",
+    "full_name": "name",
+    "applicant_name": "name",
+    "father_s_name": "father_name",
+    "fathers_name": "father_name",
+    "date_of_birth": "dob",
+    "email_address": "email",
+    "mobile": "phone",
+    "mobile_number": "phone",
+    "phone_number": "phone",
+    "pincode": "pin_code",
+    "pin": "pin_code",
+}
+
+def _normalise(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", value.strip().lower()).strip("_")
+
+def _field_name(column: str) -> str:
+    name = _normalise(column)
+    return FIELD_ALIASES.get(name, name)
+
+def parse_document_type(value: Optional[str]) -> Optional[str]:
+    """The AutomationType value for a document type as written by an operator, or None"""
+    if not value:
+        return None
+    name = _normalise(value)
+    name = DOCUMENT_TYPE_ALIASES.get(name, name)
+    return name if name in DOCUMENT_LABELS else None
+
+def batch_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """"csv" or "ndjson" from the upload's file extension or content type, or None"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if extension == "csv" or content_type == "text/csv":
+        return "csv"
+    if extension in ("ndjson", "jsonl") or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+async def _read_lines(file: UploadFile) -> AsyncIterator[str]:
+    """The upload's lines, decoded as it is read"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    while True:
+        chunk = await file.read(READ_CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+        if not chunk:
+            break
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def _csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Dict[str, Any], Optional[str]]]:
+    """(row, record, error) for each data row; the first row holds the column names"""
+    header = None
+    pending = None
+    row = 0
+    async for line in lines:
+        pending = line if pending is None else f"{pending}\n{line}"
+        if pending.count('"') % 2:
+            # A newline inside a quoted value; the record continues on the next line
+            continue
+        record, pending = pending, None
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [_field_name(value) for value in values]
+            continue
+        row += 1
+        yield row, dict(zip(header, values)), None
+    if pending is not None:
+        yield row + 1, {}, "unterminated quoted value"
+
+async def _ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Dict[str, Any], Optional[str]]]:
+    """(row, record, error) for each non-empty line"""
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, {}, "not valid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield row, {}, "not a JSON object"
+            continue
+        yield row, {_field_name(key): value for key, value in record.items()}, None
+
+def validate_applicant(record: Dict[str, Any], default_document_type: Optional[str]) -> Tuple[Optional[str], Dict[str, str], List[str]]:
+    """
+    Check one applicant against the fields its document's automation takes.
+
+    Fields with a known format are normalised by the same extractors the chat
+    flow uses. Returns (document_type, details, errors); the row can be queued
+    only if errors is empty.
+    """
+    document_type = default_document_type
+    if record.get("document_type"):
+        document_type = parse_document_type(str(record["document_type"]))
+        if document_type is None:
+            return None, {}, [f"unknown document type: {record['document_type']}"]
+    if document_type is None:
+        return None, {}, ["document_type is missing"]
+
+    details = {}
+    errors = []
+    parameters = inspect.signature(job_queue.get_handler(document_type)).parameters.values()
+    fields = [parameter.name for parameter in parameters
+              if parameter.kind not in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)]
+    for field in fields:
+        value = str(record.get(field) or "").strip()
+        if not value:
+            errors.append(f"{field} is missing")
+            continue
+        extractor = FIELD_EXTRACTORS.get(field)
+        if extractor:
+            value = extractor(value)
+            if value is None:
+                errors.append(f"{field} is not valid")
+                continue
+        details[field] = value
+    return document_type, details, errors
+
+class ApplicantBatches:
+    """
+    Bulk submission of document applications, e.g. a whole registration camp.
+
+    The uploaded CSV or NDJSON file is validated row by row as it is read, and
+    every valid row is queued straight away as a job for its document's
+    automation, so the workers start on the first applicants while the rest
+    of the file is still being read. The automations run in parallel up to the
+    number of job workers (AUTOMATION_WORKERS) and Chrome drivers
+    (WEBDRIVER_POOL_SIZE). Batches are stored in Redis for JOB_TTL seconds, or
+    in process memory without Redis; row progress is read from the jobs.
+    """
+
+    def __init__(self):
+        self._memory_batches: Dict[str, Dict[str, Any]] = {}
+
+    async def submit(self, file: UploadFile, file_format: str,
+                     document_type: Optional[str] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Validate and queue the applicants in an uploaded file and return the stored batch"""
+        lines = _read_lines(file)
+        records = _csv_records(lines) if file_format == "csv" else _ndjson_records(lines)
+        batch = {
+            "batch_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "truncated": False,
+            "created_at": datetime.now(),
+            "rows": [],
+        }
+        # Applicants already in this batch, by document and identity
+        seen: Dict[Tuple[str, ...], int] = {}
+
+        async for row, record, error in records:
+            if row > settings.BATCH_MAX_ROWS:
+                batch["truncated"] = True
+                break
+            entry = {"row": row, "document_type": None, "name": None, "job_id": None, "errors": []}
+            batch["rows"].append(entry)
+            if error:
+                entry["errors"] = [error]
+                continue
+
+            doc_type, details, errors = validate_applicant(record, document_type)
+            entry.update(document_type=doc_type, name=details.get("name") or None, errors=errors)
+            if errors:
+                continue
+            identity = (doc_type, details["name"].lower(), details["father_name"].lower(), details["dob"])
+            if identity in seen:
+                entry["errors"] = [f"duplicate of row {seen[identity]}"]
+                continue
+            seen[identity] = row
+
+            job = await job_queue.enqueue(doc_type, details, label=DOCUMENT_LABELS[doc_type], user_id=user_id)
+            entry["job_id"] = job["job_id"]
+
+        await self._save(batch)
+        print(f"BATCH {batch['batch_id']}: queued {sum(1 for entry in batch['rows'] if entry['job_id'])} "
+              f"of {len(batch['rows'])} applicants")
+        return batch
+
+    async def _save(self, batch: Dict[str, Any]):
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                data = json.dumps({**batch, "created_at": batch["created_at"].isoformat()})
+                await redis_client.set(f"{BATCH_PREFIX}{batch['batch_id']}", data, ex=settings.JOB_TTL)
+                return
+            except Exception as e:
+                print(f"Error saving batch in Redis, keeping it in memory: {e}")
+        self._memory_batches[batch["batch_id"]] = batch
+        asyncio.get_running_loop().call_later(settings.JOB_TTL, self._memory_batches.pop, batch["batch_id"], None)
+
+    async def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a stored batch, or None if it is unknown or expired"""
+        if batch_id in self._memory_batches:
+            return self._memory_batches[batch_id]
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                data = await redis_client.get(f"{BATCH_PREFIX}{batch_id}")
+            except Exception as e:
+                print(f"Error loading batch {batch_id}: {e}")
+                return None
+            if data:
+                batch = json.loads(data)
+                batch["created_at"] = datetime.fromisoformat(batch["created_at"])
+                return batch
+        return None
+
+    async def progress(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """The batch with each row's current status, counts per status and throughput"""
+        jobs = await job_queue.get_jobs([entry["job_id"] for entry in batch["rows"] if entry["job_id"]])
+        rows = []
+        finished_at = None
+        for entry in batch["rows"]:
+            row = dict(entry, status=REJECTED)
+            job = jobs.get(entry["job_id"]) if entry["job_id"] else None
+            if job:
+                row["status"] = job["status"]
+                if job["error"]:
+                    row["errors"] = row["errors"] + [job["error"]]
+                if job["status"] == JobStatus.COMPLETED.value:
+                    finished_at = max(finished_at or job["updated_at"], job["updated_at"])
+            elif entry["job_id"]:
+                # The job expired before the batch
+                row["status"] = "unknown"
+            rows.append(row)
+
+        counts = Counter(row["status"] for row in rows)
+        pending = counts[JobStatus.QUEUED.value] + counts[JobStatus.RUNNING.value]
+        applications_per_minute = None
+        if finished_at:
+            minutes = max((finished_at - batch["created_at"]).total_seconds(), 1.0) / 60
+            applications_per_minute = round(counts[JobStatus.COMPLETED.value] / minutes, 2)
+        return {
+            **batch,
+            "status": BatchStatus.PROCESSING if pending else BatchStatus.FINISHED,
+            "total": len(rows),
+            "counts": dict(counts),
+            "applications_per_minute": applications_per_minute,
+            "rows": rows,
+        }
+
+# Process-wide batch store
+applicant_batches = ApplicantBatches()
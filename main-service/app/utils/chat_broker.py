@@ -0,0 +1,108 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Set
+from app.core.config import settings
+from app.db.redis import create_pubsub_client, get_redis
+from app.schemas.chat import ChatMessage
+
+CHANNEL_PREFIX = "chat_messages:"
+
+class ChatBroker:
+    """
+    Fans out newly stored chat messages to subscribers of a chat.
+    
+    Subscribers are in-process queues. When CHAT_BROKER_USE_REDIS is enabled,
+    messages are published to a Redis channel per chat and every worker relays
+    what it receives to its own subscribers, so a message written by one worker
+    reaches clients connected to another.
+    """
+    
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._redis = None
+        self._pubsub_redis = None
+        self._listener_task = None
+    
+    async def connect(self):
+        """Start relaying Redis pub/sub messages if enabled; call after connect_to_redis()"""
+        if not settings.CHAT_BROKER_USE_REDIS:
+            return
+        
+        self._redis = get_redis()
+        if not self._redis:
+            print("Warning: Chat broker has no Redis connection. Using in-process fan-out only.")
+            return
+        # The subscription blocks on idle channels, so it gets a client without the shared socket timeout
+        self._pubsub_redis = create_pubsub_client()
+        self._listener_task = asyncio.create_task(self._listen())
+        print("Chat broker relaying through Redis pub/sub")
+    
+    async def close(self):
+        """Stop the Redis listener and its client; the shared Redis client is closed by close_redis_connection()"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self._pubsub_redis:
+            await self._pubsub_redis.aclose()
+            self._pubsub_redis = None
+        self._redis = None
+    
+    async def publish(self, chat_id: str, message: ChatMessage):
+        """Publish a new message to all subscribers of a chat"""
+        if self._redis:
+            try:
+                await self._redis.publish(f"{CHANNEL_PREFIX}{chat_id}", message.json())
+                return
+            except Exception as e:
+                print(f"Error publishing chat message to Redis: {e}")
+        
+        # No Redis (or it failed): deliver to this worker's subscribers only
+        self._dispatch(chat_id, message)
+    
+    @asynccontextmanager
+    async def subscribe(self, chat_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to new messages of a chat, yielding a queue of ChatMessage objects"""
+        queue = asyncio.Queue(maxsize=settings.CHAT_BROKER_QUEUE_SIZE)
+        self._subscribers.setdefault(chat_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(chat_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[chat_id]
+    
+    def _dispatch(self, chat_id: str, message: ChatMessage):
+        """Hand a message to the local subscribers of a chat"""
+        for queue in self._subscribers.get(chat_id, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client should not hold up the others; it can resync by fetching the chat
+                print(f"Dropping chat message for slow subscriber of chat {chat_id}")
+    
+    async def _listen(self):
+        """Relay messages from Redis to local subscribers, reconnecting on errors"""
+        while True:
+            try:
+                async with self._pubsub_redis.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for item in pubsub.listen():
+                        if item["type"] != "pmessage":
+                            continue
+                        chat_id = item["channel"].decode()[len(CHANNEL_PREFIX):]
+                        if chat_id in self._subscribers:
+                            self._dispatch(chat_id, ChatMessage(**json.loads(item["data"])))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Chat broker Redis listener error: {e}")
+                await asyncio.sleep(1)
+
+chat_broker = ChatBroker()
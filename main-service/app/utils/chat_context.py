@@ -0,0 +1,89 @@
+from typing import List, Tuple
+from app.core.config import settings
+from app.schemas.chat import Chat, ChatMessage, MessageType, format_messages_for_gemini
+
+# Upper bound on messages folded into the summary by one refresh, so a first
+# refresh on a very long chat doesn't send the whole history at once
+MAX_MESSAGES_PER_SUMMARY = 200
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of model tokens in a text.
+
+    Uses about four UTF-8 bytes per token, which also counts Devanagari text
+    (three bytes per character) as the denser text it is.
+    """
+    return len(text.encode("utf-8")) // 4 + 1
+
+def build_chat_context(chat: Chat, new_messages: List[ChatMessage]) -> Tuple[str, int]:
+    """
+    Build the conversation context sent to Gemini for a chat.
+
+    The newest text messages are kept verbatim, up to CHAT_CONTEXT_MAX_MESSAGES
+    and CHAT_CONTEXT_TOKEN_BUDGET tokens. Anything older is represented by the
+    chat's rolling summary, if it has one.
+
+    Args:
+        chat: The chat, with (at least) its most recent messages loaded
+        new_messages: Messages not stored yet that belong at the end of the chat
+
+    Returns:
+        Tuple of (formatted context, seq of the last message left out of the verbatim window)
+    """
+    messages = [msg for msg in chat.messages + new_messages if msg.type == MessageType.TEXT]
+
+    # Walk back from the newest message until the budget is used up
+    budget = settings.CHAT_CONTEXT_TOKEN_BUDGET
+    if chat.context_summary:
+        budget -= estimate_tokens(chat.context_summary)
+    kept = 0
+    for msg in reversed(messages[-settings.CHAT_CONTEXT_MAX_MESSAGES:]):
+        cost = estimate_tokens(msg.format_for_gemini())
+        # Always keep the latest message, even if it alone exceeds the budget
+        if kept and cost > budget:
+            break
+        budget -= cost
+        kept += 1
+
+    verbatim = messages[len(messages) - kept:]
+    dropped_upto = _seq_before(chat, verbatim[0]) if verbatim else chat.context_summary_seq
+
+    context = format_messages_for_gemini(verbatim)
+    if chat.context_summary:
+        context = f"Summary of earlier conversation: {chat.context_summary}\n\n{context}"
+    return context, dropped_upto
+
+def _seq_before(chat: Chat, message: ChatMessage) -> int:
+    """Sequence number of the message preceding `message` in the chat"""
+    if message.seq is not None:
+        return message.seq - 1
+    # Not stored yet, so everything loaded so far precedes it
+    return chat.messages[-1].seq if chat.messages else chat.context_summary_seq
+
+def is_summary_stale(chat: Chat, dropped_upto: int) -> bool:
+    """Check whether enough messages fell out of the verbatim window to refresh the summary"""
+    return dropped_upto - chat.context_summary_seq >= settings.CHAT_SUMMARY_REFRESH_MESSAGES
+
+async def refresh_chat_summary(chat_repo, gemini, chat: Chat, dropped_upto: int):
+    """
+    Fold the messages that left the verbatim window into the chat's rolling summary.
+
+    Meant to run after the reply has been sent, e.g. as a background task.
+    """
+    result = await chat_repo.get_messages_after(
+        chat.chat_id,
+        after=chat.context_summary_seq,
+        limit=min(dropped_upto - chat.context_summary_seq, MAX_MESSAGES_PER_SUMMARY)
+    )
+    if not result or not result[0]:
+        return
+    messages = result[0]
+
+    try:
+        summary = await gemini.summarize_conversation(chat.context_summary, format_messages_for_gemini(messages))
+    except Exception as e:
+        print(f"Error refreshing summary for chat {chat.chat_id}: {e}")
+        return
+
+    if summary:
+        await chat_repo.update_context_summary(chat.chat_id, summary, messages[-1].seq)
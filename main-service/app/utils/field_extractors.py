@@ -0,0 +1,170 @@
+import datetime
+import difflib
+import re
+from typing import Optional
+
+# Deterministic extractors for document form fields. Each takes the user's
+# message and returns the normalised value, or None if it can't find a valid one.
+
+# Devanagari digits are converted so "९८७६५४३२१०" is read as a phone number
+DIGIT_TRANSLATION = str.maketrans("०१२३४५६७८९", "0123456789")
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# Indian mobile numbers, optionally with a +91/91/0 prefix
+PHONE_PATTERN = re.compile(r"(?<![\d+])(?:\+?91|0)?([6-9]\d{9})(?!\d)")
+PIN_CODE_PATTERN = re.compile(r"(?<!\d)([1-9]\d{5})(?!\d)")
+# Spaces and dashes between digits, as in "98765 43210" or "263 136"
+DIGIT_SEPARATOR_PATTERN = re.compile(r"(?<=\d)[\s-](?=\d)")
+# Words, including Devanagari vowel signs (which \w doesn't match) but not the danda
+WORD_PATTERN = re.compile(r"(?:[^\W_]|[\u0900-\u0963\u0966-\u097F])+")
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+    "जनवरी": 1, "फरवरी": 2, "फ़रवरी": 2, "मार्च": 3, "अप्रैल": 4, "मई": 5, "जून": 6,
+    "जुलाई": 7, "अगस्त": 8, "सितंबर": 9, "सितम्बर": 9, "अक्टूबर": 10, "अक्तूबर": 10,
+    "नवंबर": 11, "नवम्बर": 11, "दिसंबर": 12, "दिसम्बर": 12,
+}
+DATE_PATTERNS = [
+    # 14-08-1992, 14/8/1992, 14.08.1992 (day first, as written in India)
+    (re.compile(r"(?<!\d)(\d{1,2})[-/. ](\d{1,2})[-/. ](\d{4})(?!\d)"), ("day", "month", "year")),
+    # 1992-08-14
+    (re.compile(r"(?<!\d)(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?!\d)"), ("year", "month", "day")),
+    # 14 August 1992, 14th Aug, 1992, 14 अगस्त 1992
+    (re.compile(r"(?<!\d)(\d{1,2})(?:st|nd|rd|th)?\s+([^\W\d_][\w\u0900-\u0963]*)\.?,?\s+(\d{4})(?!\d)"), ("day", "month", "year")),
+    # August 14, 1992
+    (re.compile(r"([^\W\d_][\w\u0900-\u0963]*)\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})(?!\d)"), ("month", "day", "year")),
+]
+
+GENDER_SYNONYMS = {
+    "Male": {"male", "man", "boy", "gent", "purush", "ladka", "mard", "aadmi",
+             "पुरुष", "पुरूष", "लड़का", "लडका", "मर्द", "आदमी"},
+    "Female": {"female", "woman", "girl", "lady", "mahila", "stri", "ladki", "aurat",
+               "महिला", "स्त्री", "लड़की", "लडकी", "औरत"},
+    "Transgender": {"transgender", "trans", "other", "kinnar", "ट्रांसजेंडर", "किन्नर", "अन्य"},
+}
+GENDERS = {synonym: gender for gender, synonyms in GENDER_SYNONYMS.items() for synonym in synonyms}
+# Single letters only count as the whole answer; "I'm female" contains an "m"
+GENDER_LETTERS = {"m": "Male", "f": "Female"}
+
+INDIAN_STATES = [
+    "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat",
+    "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Manipur", "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab",
+    "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh",
+    "Uttarakhand", "West Bengal",
+    # Union territories
+    "Andaman and Nicobar Islands", "Chandigarh", "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi", "Jammu and Kashmir", "Ladakh", "Lakshadweep", "Puducherry",
+]
+STATE_ALIASES = {
+    "ap": "Andhra Pradesh", "up": "Uttar Pradesh", "mp": "Madhya Pradesh", "hp": "Himachal Pradesh",
+    "uk": "Uttarakhand", "wb": "West Bengal", "tn": "Tamil Nadu", "jk": "Jammu and Kashmir",
+    "j and k": "Jammu and Kashmir", "uttaranchal": "Uttarakhand", "orissa": "Odisha",
+    "pondicherry": "Puducherry", "new delhi": "Delhi", "nct of delhi": "Delhi",
+    "bengal": "West Bengal", "kashmir": "Jammu and Kashmir",
+    "उत्तराखंड": "Uttarakhand", "उत्तराखण्ड": "Uttarakhand", "उत्तर प्रदेश": "Uttar Pradesh",
+    "मध्य प्रदेश": "Madhya Pradesh", "हिमाचल प्रदेश": "Himachal Pradesh", "बिहार": "Bihar",
+    "राजस्थान": "Rajasthan", "दिल्ली": "Delhi", "हरियाणा": "Haryana", "पंजाब": "Punjab",
+    "गुजरात": "Gujarat", "महाराष्ट्र": "Maharashtra", "झारखंड": "Jharkhand", "छत्तीसगढ़": "Chhattisgarh",
+    "पश्चिम बंगाल": "West Bengal", "ओडिशा": "Odisha", "असम": "Assam", "कर्नाटक": "Karnataka",
+    "केरल": "Kerala", "तमिलनाडु": "Tamil Nadu", "तेलंगाना": "Telangana", "आंध्र प्रदेश": "Andhra Pradesh",
+    "गोवा": "Goa", "सिक्किम": "Sikkim", "जम्मू और कश्मीर": "Jammu and Kashmir", "लद्दाख": "Ladakh",
+}
+STATE_NAMES = {state.lower(): state for state in INDIAN_STATES}
+STATE_NAMES.update(STATE_ALIASES)
+# Longest names first, so "West Bengal" wins over "Bengal"
+STATE_PATTERNS = [
+    (re.compile(rf"(?<!\w){re.escape(name)}(?!\w)"), state)
+    for name, state in sorted(STATE_NAMES.items(), key=lambda item: len(item[0]), reverse=True)
+    # Two-letter abbreviations only count as the whole answer
+    if len(name) > 3
+]
+# How similar a misspelt state name has to be to match
+STATE_FUZZY_CUTOFF = 0.8
+
+
+def _search_digits(pattern: re.Pattern, message: str) -> Optional[str]:
+    """
+    Search a message for a number, reading Devanagari digits as well.
+
+    Numbers written in groups ("98765 43210") are found by a second search with
+    the separators between digits removed.
+    """
+    text = message.translate(DIGIT_TRANSLATION)
+    match = pattern.search(text) or pattern.search(DIGIT_SEPARATOR_PATTERN.sub("", text))
+    return match.group(1) if match else None
+
+
+def extract_email(message: str) -> Optional[str]:
+    """The first email address in the message, lowercased"""
+    match = EMAIL_PATTERN.search(message)
+    return match.group(0).lower() if match else None
+
+
+def extract_phone(message: str) -> Optional[str]:
+    """A 10-digit Indian mobile number, without country code or leading 0"""
+    return _search_digits(PHONE_PATTERN, message)
+
+
+def extract_pin_code(message: str) -> Optional[str]:
+    """A 6-digit PIN code"""
+    return _search_digits(PIN_CODE_PATTERN, message)
+
+
+def extract_dob(message: str) -> Optional[str]:
+    """A past date of birth, as DD-MM-YYYY"""
+    text = message.translate(DIGIT_TRANSLATION).lower()
+    today = datetime.date.today()
+    for pattern, parts in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            values = dict(zip(parts, match.groups()))
+            month = values["month"]
+            if not month.isdigit():
+                month = MONTHS.get(month) or MONTHS.get(month[:3])
+                if month is None:
+                    continue
+            try:
+                date = datetime.date(int(values["year"]), int(month), int(values["day"]))
+            except ValueError:
+                continue
+            if date.year >= 1900 and date <= today:
+                return date.strftime("%d-%m-%Y")
+    return None
+
+
+def extract_gender(message: str) -> Optional[str]:
+    """Male, Female or Transgender, from English, Hindi or romanised Hindi words"""
+    words = WORD_PATTERN.findall(message.lower())
+    if len(words) == 1 and words[0] in GENDER_LETTERS:
+        return GENDER_LETTERS[words[0]]
+    genders = {GENDERS[word] for word in words if word in GENDERS}
+    # "male or female?" is not an answer
+    return genders.pop() if len(genders) == 1 else None
+
+
+def extract_state(message: str) -> Optional[str]:
+    """An Indian state or union territory, tolerating abbreviations and small misspellings"""
+    text = " ".join(WORD_PATTERN.findall(message.lower().replace("&", " and ")))
+    if not text:
+        return None
+    if text in STATE_NAMES:
+        return STATE_NAMES[text]
+    for pattern, state in STATE_PATTERNS:
+        if pattern.search(text):
+            return state
+
+    # Misspellings: compare the whole answer and each run of up to three words
+    words = text.split()
+    candidates = [text] + [
+        " ".join(words[start:start + length])
+        for length in (3, 2, 1)
+        for start in range(len(words) - length + 1)
+    ]
+    for candidate in candidates:
+        if len(candidate) <= 3:
+            continue
+        matches = difflib.get_close_matches(candidate, STATE_NAMES.keys(), n=1, cutoff=STATE_FUZZY_CUTOFF)
+        if matches:
+            return STATE_NAMES[matches[0]]
+    return None
@@ -1,40 +1,222 @@
+import asyncio
+import hashlib
+import json
 import os
 import shutil
 import uuid
-from fastapi import UploadFile
+from datetime import datetime
+from fastapi import HTTPException, UploadFile
+from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Any, BinaryIO, Dict, NamedTuple, Optional
+from app.core.config import settings
+from app.schemas.chat import MessageType
 
 # Define the uploads directory relative to the project
 UPLOADS_DIR = Path("app/static/uploads")
 
+# Content-addressed blobs, as blobs/<first 2 hex digits>/<sha256>; uploaded
+# files are hard links to them, so a blob's link count is its reference count
+BLOBS_DIR = UPLOADS_DIR / "blobs"
+
+# Per-file metadata (digest, size, original name and content type), as meta/<filename>.json
+METADATA_DIR = UPLOADS_DIR / "meta"
+
+# Generated previews such as thumbnails, see app.utils.thumbnails
+DERIVATIVES_DIR = UPLOADS_DIR / "derived"
+
+# Bytes read from the upload and written to disk at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Largest accepted upload per message type
+MAX_UPLOAD_BYTES = {
+    MessageType.IMAGE: settings.UPLOAD_MAX_MB_IMAGE * 1024 * 1024,
+    MessageType.PDF: settings.UPLOAD_MAX_MB_PDF * 1024 * 1024,
+    MessageType.AUDIO: settings.UPLOAD_MAX_MB_AUDIO * 1024 * 1024,
+    MessageType.VIDEO: settings.UPLOAD_MAX_MB_VIDEO * 1024 * 1024,
+    MessageType.FILE: settings.UPLOAD_MAX_MB_FILE * 1024 * 1024,
+}
+
+class UploadTooLarge(Exception):
+    """The upload is over the size limit of its message type"""
+
+    def __init__(self, message_type: MessageType, limit: int):
+        super().__init__(f"{message_type.value} uploads are limited to {limit // (1024 * 1024)} MB")
+        self.message_type = message_type
+        self.limit = limit
+
+class SavedUpload(NamedTuple):
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    # True if the same content was already stored and the file shares its blob
+    deduplicated: bool = False
+
+def message_type_for(content_type: Optional[str]) -> MessageType:
+    """The chat message type of a file from its content type"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type == "application/pdf":
+        return MessageType.PDF
+    for prefix, message_type in (("image/", MessageType.IMAGE), ("audio/", MessageType.AUDIO), ("video/", MessageType.VIDEO)):
+        if content_type.startswith(prefix):
+            return message_type
+    return MessageType.FILE
+
+def max_upload_size(message_type: Optional[MessageType] = None) -> int:
+    """Size limit in bytes for a message type, or the largest limit if the type isn't known yet"""
+    if message_type is None or message_type not in MAX_UPLOAD_BYTES:
+        return max(MAX_UPLOAD_BYTES.values())
+    return MAX_UPLOAD_BYTES[message_type]
+
+class PublicStaticFiles(StaticFiles):
+    """
+    The static files mount, without the storage internals under the uploads
+    directory: blobs, metadata and derivatives are only served through the
+    uploads API, and partial uploads not at all
+    """
+
+    async def get_response(self, path: str, scope):
+        parts = Path(path).parts
+        if parts and parts[0] == UPLOADS_DIR.name and (
+            (len(parts) > 1 and parts[1] in (BLOBS_DIR.name, METADATA_DIR.name, DERIVATIVES_DIR.name))
+            or path.endswith(".part")
+        ):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+def _write_chunk(buffer: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+def _remove_partial(partial_path: str):
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
 class FileStorage:
     def __init__(self):
         # Ensure the uploads directory exists
         os.makedirs(UPLOADS_DIR, exist_ok=True)
+        os.makedirs(METADATA_DIR, exist_ok=True)
+        os.makedirs(DERIVATIVES_DIR, exist_ok=True)
+        if settings.UPLOAD_CONTENT_ADDRESSED:
+            os.makedirs(BLOBS_DIR, exist_ok=True)
     
-    async def save_upload(self, file: UploadFile) -> Tuple[str, str]:
+    async def save_upload(self, file: UploadFile, message_type: Optional[MessageType] = None) -> SavedUpload:
         """
         Save an uploaded file with a unique filename
-        
+
+        The file is copied in chunks with the disk I/O and hashing in a
+        worker thread, so large uploads don't block the event loop, and the
+        size and SHA-256 are computed in the same pass. In content-addressed
+        mode, a file whose content is already stored becomes another link to
+        the existing blob instead of a new copy.
+
         Args:
             file: The uploaded file
-            
+            message_type: The kind of file, for its size limit; guessed from the content type if not given
+
         Returns:
-            Tuple containing (unique_filename, file_path)
+            SavedUpload with the unique filename, file path, size and SHA-256
+
+        Raises:
+            UploadTooLarge: The file is over its type's size limit; nothing is kept
         """
+        message_type = message_type or message_type_for(file.content_type)
+        limit = max_upload_size(message_type)
+        # Reject before copying anything if the size is already known
+        if file.size is not None and file.size > limit:
+            raise UploadTooLarge(message_type, limit)
+
         # Generate a unique filename to prevent collisions
         file_extension = os.path.splitext(file.filename)[1] if file.filename else ""
         unique_filename = f"{uuid.uuid4()}{file_extension}"
-        
+
         # Create the file path
         file_path = os.path.join(UPLOADS_DIR, unique_filename)
-        
-        # Save the file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        return unique_filename, str(file_path)
+        # Written under a temporary name so a failed upload never shows up as a document
+        partial_path = f"{file_path}.part"
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            # Opening and closing touch the disk too, so they run in the worker thread as well
+            buffer = await asyncio.to_thread(open, partial_path, "wb")
+            try:
+                while chunk := await file.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > limit:
+                        raise UploadTooLarge(message_type, limit)
+                    await asyncio.to_thread(_write_chunk, buffer, digest, chunk)
+            finally:
+                await asyncio.to_thread(buffer.close)
+            sha256 = digest.hexdigest()
+            deduplicated = False
+            if settings.UPLOAD_CONTENT_ADDRESSED:
+                deduplicated = await asyncio.to_thread(self._link_blob, partial_path, sha256, file_path)
+            else:
+                await asyncio.to_thread(os.replace, partial_path, file_path)
+        except BaseException:
+            await asyncio.to_thread(_remove_partial, partial_path)
+            raise
+
+        await asyncio.to_thread(self._write_metadata, unique_filename, {
+            "sha256": sha256,
+            "size": size,
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "uploaded_at": datetime.now().isoformat(),
+        })
+        return SavedUpload(unique_filename, str(file_path), size, sha256, deduplicated)
+
+    @staticmethod
+    def _blob_path(sha256: str) -> str:
+        return os.path.join(BLOBS_DIR, sha256[:2], sha256)
+
+    def _link_blob(self, partial_path: str, sha256: str, file_path: str) -> bool:
+        """
+        Store a fully written upload as a link to the blob for its digest,
+        reusing an existing blob. Returns True if the blob already existed.
+        """
+        blob_path = self._blob_path(sha256)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(blob_path, file_path)
+            os.remove(partial_path)
+            return True
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # No hard links on this filesystem; keep the upload itself as a plain copy
+            print(f"Warning: Could not link upload to its blob ({str(e)})")
+            os.replace(partial_path, file_path)
+            return False
+        os.replace(partial_path, blob_path)
+        try:
+            os.link(blob_path, file_path)
+        except OSError as e:
+            # No hard links on this filesystem; keep a plain copy without deduplication
+            print(f"Warning: Could not link upload to its blob ({str(e)})")
+            shutil.copyfile(blob_path, file_path)
+        return False
+
+    def _write_metadata(self, filename: str, metadata: Dict[str, Any]):
+        with open(os.path.join(METADATA_DIR, f"{filename}.json"), "w") as f:
+            json.dump(metadata, f)
+
+    def get_metadata(self, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the stored details of a file: sha256, size, and the original filename
+        and content type. None for unknown files and files uploaded before
+        metadata was kept.
+        """
+        if os.path.basename(filename) != filename:
+            return None
+        try:
+            with open(os.path.join(METADATA_DIR, f"{filename}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
     
     def get_file_path(self, filename: str) -> Optional[str]:
         """
@@ -46,13 +228,19 @@ class FileStorage:
         Returns:
             The file path or None if file doesn't exist
         """
+        # Only files directly in the uploads directory, not blobs or metadata
+        if os.path.basename(filename) != filename:
+            return None
         file_path = os.path.join(UPLOADS_DIR, filename)
-        return file_path if os.path.exists(file_path) else None
+        return file_path if os.path.isfile(file_path) else None
         
     def delete_file(self, filename: str) -> bool:
         """
         Delete a file
         
+        The content-addressed blob behind it is removed too once no other file
+        links to it.
+        
         Args:
             filename: The unique filename
             
@@ -61,6 +249,36 @@ class FileStorage:
         """
         file_path = self.get_file_path(filename)
         if file_path:
+            metadata = self.get_metadata(filename)
             os.remove(file_path)
+            metadata_path = os.path.join(METADATA_DIR, f"{filename}.json")
+            if os.path.exists(metadata_path):
+                os.remove(metadata_path)
+            if metadata and metadata.get("sha256") and settings.UPLOAD_CONTENT_ADDRESSED:
+                # Derivatives are shared by every file with the same content
+                if self._release_blob(metadata["sha256"]):
+                    self._delete_derivatives(metadata["sha256"])
+            else:
+                self._delete_derivatives(self.derivative_key(filename, metadata))
+            return True
+        return False
+    
+    def _release_blob(self, sha256: str) -> bool:
+        """Remove a blob that only the blob store still links to; True if it is gone"""
+        blob_path = self._blob_path(sha256)
+        try:
+            if os.stat(blob_path).st_nlink <= 1:
+                os.remove(blob_path)
+                return True
+            return False
+        except FileNotFoundError:
             return True
-        return False
\ No newline at end of file
+    
+    @staticmethod
+    def derivative_key(filename: str, metadata: Optional[Dict[str, Any]]) -> str:
+        """Name under which a file's derivatives are cached: its content digest if known"""
+        return (metadata or {}).get("sha256") or filename
+    
+    def _delete_derivatives(self, key: str):
+        for path in DERIVATIVES_DIR.glob(f"{key}-*"):
+            path.unlink(missing_ok=True)
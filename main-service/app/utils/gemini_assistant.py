@@ -1,14 +1,24 @@
 import enum
+import hashlib
 import json
-import pickle
-from typing import Dict, List, Any, Optional, Tuple
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
 import os
-import redis
 from .pan_card import make_pan_card
 from .voter_id import make_voter_id
 from .learner_license import make_learner_license
+from .state_store import ConversationStateStore
+from .field_extractors import extract_dob, extract_email, extract_gender, extract_phone, extract_pin_code, extract_state
+from .language_detection import GreetingMatcher, detect_language
+from .llm_cache import LLMCache, prompt_fingerprint
+from .llm_scheduler import Priority, llm_scheduler
+from .single_flight import SingleFlight
+from .job_queue import job_queue
+from app.db.repositories.chat_repository import get_chat_repository
+from app.schemas.chat import ChatMessage, MessageSender, MessageType
+from app.schemas.job import JobStatus
+from .intent_classifier import IntentClassifier, FREELANCER as FREELANCER_INTENT, CHAT as CHAT_INTENT
+from app.core.config import settings
 
 # Load API key from environment variable
 GOOGLE_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
@@ -18,22 +28,6 @@ if not GOOGLE_API_KEY:
 # Configure the Gemini API
 genai.configure(api_key=GOOGLE_API_KEY)
 
-# Initialize Redis client for state persistence
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
-REDIS_PREFIX = "gemini_state:"
-
-# Try to connect to Redis, fall back to in-memory if not available
-try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-    redis_client.ping()  # Test connection
-    print("Connected to Redis for state persistence")
-    USE_REDIS = True
-except Exception as e:
-    print(f"Warning: Could not connect to Redis ({str(e)}). Using in-memory state storage.")
-    USE_REDIS = False
-
 class ResponseType(enum.Enum):
     """Enum for the type of response to generate."""
     AI_RESPONSE = "ai_response"
@@ -62,13 +56,50 @@ class DocumentField(enum.Enum):
     CONFIRMATION = "confirmation"
     COMPLETED = "completed"
 
+# Deterministic extractors for fields with a known format. They run before any
+# Gemini extraction, and also validate what Gemini extracts.
+FIELD_EXTRACTORS = {
+    DocumentField.EMAIL.value: extract_email,
+    DocumentField.PHONE.value: extract_phone,
+    DocumentField.PIN_CODE.value: extract_pin_code,
+    DocumentField.DOB.value: extract_dob,
+    DocumentField.GENDER.value: extract_gender,
+    DocumentField.STATE.value: extract_state,
+}
+
+# Structured output of GeminiAssistant._route_request
+ROUTER_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "format": "enum", "enum": [response_type.value for response_type in ResponseType]},
+        "automation_type": {"type": "string", "format": "enum", "enum": [automation_type.value for automation_type in AutomationType]},
+        "details": {
+            "type": "object",
+            "properties": {
+                field.value: {"type": "string"}
+                for field in DocumentField
+                if field not in (DocumentField.CONFIRMATION, DocumentField.COMPLETED)
+            },
+        },
+        "reply": {"type": "string"},
+    },
+    "required": ["intent", "automation_type", "reply"],
+}
+
 class ConversationState:
     """Tracks the state of a document creation conversation."""
     
+    __slots__ = ("document_type", "current_field", "details", "stored_fields")
+    
+    # Version of the to_hash() layout; bump it when the layout changes incompatibly
+    SERIALIZATION_VERSION = "1"
+    
     def __init__(self):
         """Initialize a new conversation state."""
         self.document_type = AutomationType.NONE
         self.current_field = None
+        # Hash fields as last loaded from or saved to storage, used to write only what changed
+        self.stored_fields = None
         self.details = {
             "name": "",
             "father_name": "",
@@ -132,20 +163,69 @@ class ConversationState:
         self.document_type = AutomationType.NONE
         self.current_field = None
         self.details = {field: "" for field in self.details}
+        
+    def to_hash(self) -> Dict[str, str]:
+        """Serialize the state to a flat mapping of strings, one entry per field."""
+        data = {
+            "v": self.SERIALIZATION_VERSION,
+            "document_type": self.document_type.value,
+            "current_field": self.current_field.value if self.current_field else "",
+        }
+        for field, value in self.details.items():
+            data[f"details.{field}"] = value
+        return data
+        
+    @classmethod
+    def from_hash(cls, data: Dict[Any, Any]) -> Optional["ConversationState"]:
+        """
+        Deserialize a state written by to_hash().
+        
+        Accepts the bytes keys and values returned by Redis. Missing fields keep
+        their defaults. Returns None for an unknown serialization version.
+        """
+        data = {
+            (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+            for key, value in data.items()
+        }
+        if data.get("v") != cls.SERIALIZATION_VERSION:
+            print(f"Ignoring conversation state with unknown version {data.get('v')}")
+            return None
+            
+        state = cls()
+        state.document_type = AutomationType(data.get("document_type", AutomationType.NONE.value))
+        current_field = data.get("current_field")
+        state.current_field = DocumentField(current_field) if current_field else None
+        for field in state.details:
+            state.details[field] = data.get(f"details.{field}", "")
+        state.stored_fields = data
+        return state
 
 class GeminiAssistant:
     """Assistant powered by Google's Gemini model."""
     
     def __init__(self):
-        """Initialize the Gemini assistant."""
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash",
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-            }
+        """
+        Initialize the Gemini assistant.
+        
+        Create a single instance per process with init_gemini_assistant() and get
+        it with get_gemini_assistant(); the in-memory caches live on it.
+        """
+        model_name = "gemini-2.0-flash"
+        generation_config = {
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "top_k": 40,
+        }
+        self.model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+        
+        # Cache of classification results and context-free answers; keys include the model configuration
+        self.model_config_key = json.dumps({"model": model_name, **generation_config}, sort_keys=True)
+        self.llm_cache = LLMCache(
+            {"classification": settings.LLM_CACHE_CLASSIFICATION_TTL, "faq": settings.LLM_CACHE_FAQ_TTL},
+            settings.LLM_CACHE_MAX_ENTRIES
         )
+        # Gemini calls in flight, by cache key, so identical concurrent prompts share one call
+        self.in_flight = SingleFlight()
         
         # List of automated services
         self.automation_services = [service.value for service in AutomationType if service != AutomationType.NONE]
@@ -163,142 +243,37 @@ class GeminiAssistant:
             "api development"
         ]
         
-        # Common greeting terms in multiple languages
-        self.greeting_terms = [
-            # English
-            "hello", "hi", "hey", "good morning", "good afternoon", "good evening", "greetings", "welcome", "namaste", "namastey", "",
-            # Hindi
-            "नमस्ते", "नमस्कार", "प्रणाम", "सुप्रभात", "शुभ दिन",
-            # Spanish
-            "hola", "buenos días", "buenas tardes", "buenas noches",
-            # French
-            "bonjour", "salut", "bonsoir",
-            # German
-            "hallo", "guten tag", "guten morgen",
-            # Italian
-            "ciao", "buongiorno", "salve",
-            # Portuguese
-            "olá", "bom dia", "boa tarde",
-            # Russian
-            "привет", "здравствуйте", "добрый день",
-            # Japanese
-            "こんにちは", "おはよう", "こんばんは",
-            # Chinese
-            "你好", "早上好", "晚上好",
-            # Arabic
-            "مرحبا", "السلام عليكم", "صباح الخير",
-            # Kumaoni/Garhwali and other Indian languages
-            "राम राम", "जय हो", "सत श्री अकाल", "वणक्कम्", "अदाब", "नमो नमः"
-        ]
+        # Greeting matcher, built once
+        self.greeting_matcher = GreetingMatcher()
         
         # State management for document creation conversations
-        self.conversation_states = {}
-    
-    def _is_simple_greeting(self, message: str) -> bool:
-        """
-        Detect if a message is a simple greeting in any language.
-        
-        Args:
-            message: The message to check
-            
-        Returns:
-            True if the message appears to be a simple greeting, False otherwise
-        """
-        # Convert to lowercase for case-insensitive matching
-        message_lower = message.lower().strip()
-        
-        # Check if the message contains only a greeting
-        # First check if it's a very short message (likely just a greeting)
-        if len(message_lower.split()) <= 3:
-            # Then check if it contains any common greeting terms
-            for greeting in self.greeting_terms:
-                # Only check if greeting is in message (not the reverse)
-                # Check with word boundaries to avoid false positives (like "hi" in "bhimtal")
-                if greeting == message_lower or f" {greeting} " in f" {message_lower} ":
-                    print(f"GREETING DETECTED: '{message_lower}' matches '{greeting}'")
-                    return True
-                    
-        return False
-        
-    def _detect_greeting_language(self, message: str) -> str:
-        """
-        Detect the language of a greeting.
-        
-        Args:
-            message: The greeting message to check
-            
-        Returns:
-            The detected language code ("hi" for Hindi, "en" for English, etc.)
-        """
-        # Convert to lowercase for case-insensitive matching
-        message_lower = message.lower().strip()
-        
-        # Define language-specific greeting patterns
-        hindi_greetings = ["नमस्ते", "नमस्कार", "प्रणाम", "सुप्रभात", "शुभ दिन", "राम राम", "जय हो", 
-                          "सत श्री अकाल", "नमो नमः", "namaste", "namaskar", "namastey", 
-                          "namaskaar", "pranaam", "ram ram"]
-        
-        kumaoni_greetings = ["जय बो"]
-        
-        garhwali_greetings = ["जय भगवान", "जय बदरी विशाल"]
-        
-        # Check for Hindi greetings
-        for greeting in hindi_greetings:
-            if greeting == message_lower or greeting in message_lower:
-                print(f"HINDI GREETING DETECTED: '{message_lower}'")
-                return "hindi"
-                
-        # Check for Kumaoni greetings
-        for greeting in kumaoni_greetings:
-            if greeting == message_lower or greeting in message_lower:
-                print(f"KUMAONI GREETING DETECTED: '{message_lower}'")
-                return "kumaoni"
-                
-        # Check for Garhwali greetings
-        for greeting in garhwali_greetings:
-            if greeting == message_lower or greeting in message_lower:
-                print(f"GARHWALI GREETING DETECTED: '{message_lower}'")
-                return "gharwali"
-        
-        # Default to English
-        return "en"
+        self.state_store = ConversationStateStore(ConversationState)
         
-    def _get_or_create_conversation_state(self, user_id: int) -> ConversationState:
-        """Get or create a conversation state for a user."""
-        if USE_REDIS:
-            # Try to load state from Redis
-            try:
-                state_data = redis_client.get(f"{REDIS_PREFIX}{user_id}")
-                if state_data:
-                    # Unpickle the data to restore the state
-                    state = pickle.loads(state_data)
-                    print(f"Loaded state for user {user_id} from Redis")
-                    return state
-            except Exception as e:
-                print(f"Error loading state from Redis: {e}")
-        
-        # Fallback to in-memory state
-        if user_id not in self.conversation_states:
-            self.conversation_states[user_id] = ConversationState()
-        return self.conversation_states[user_id]
-        
-    def _save_conversation_state(self, user_id: int, state: ConversationState):
-        """Save a user's conversation state to persistent storage."""
-        if not USE_REDIS:
-            # In-memory storage only, already saved in the dictionary
-            return
-            
+        # Local classifier tried before the Gemini intent calls
+        self.intent_classifier = IntentClassifier(settings.INTENT_CLASSIFIER_THRESHOLD)
+    
+    async def warm_up(self):
+        """Open the connection to the Gemini API ahead of the first user request."""
         try:
-            # Serialize the state object using pickle
-            state_data = pickle.dumps(state)
-            # Store it in Redis with an expiration of 1 hour (3600 seconds)
-            redis_client.setex(f"{REDIS_PREFIX}{user_id}", 3600, state_data)
-            print(f"Saved state for user {user_id} to Redis")
+            await llm_scheduler.run(lambda: self.model.count_tokens_async("warm-up"), Priority.BACKGROUND)
+            print("Gemini assistant warmed up")
         except Exception as e:
-            print(f"Error saving state to Redis: {e}")
+            print(f"Warning: Gemini warm-up failed ({str(e)})")
+    
+    async def _get_or_create_conversation_state(self, user_id: int) -> ConversationState:
+        """Get or create a conversation state for a user."""
+        state = await self.state_store.load(user_id)
+        if state is None:
+            state = ConversationState()
+        return state
+        
+    async def _save_conversation_state(self, user_id: int, state: ConversationState):
+        """Save a user's conversation state to persistent storage."""
+        await self.state_store.save(user_id, state)
             
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    async def process_chat(self, chat_history: str, language: str = "en") -> Tuple[str, Optional[str]]:
+    @llm_scheduler.with_retry_budget
+    async def process_chat(self, chat_history: str, language: str = "en", stream: bool = False, user_id: int = 1,
+                           chat_id: Optional[str] = None) -> Tuple[Union[str, AsyncIterator[str]], Optional[str]]:
         """
         Process a chat conversation and generate an appropriate response.
         This is the main consolidated function that handles all types of requests.
@@ -307,10 +282,14 @@ class GeminiAssistant:
             chat_history: String representation of chat messages between user and assistant
                           in the format "Role: Message\n\nRole: Message\n\n"
             language: The preferred language for the response
+            stream: If True, a generated AI reply is returned as an async iterator of
+                    text chunks instead of a complete string
+            user_id: The user whose document conversation state to use
+            chat_id: The chat that progress of a queued document automation is posted to
             
         Returns:
             A tuple containing:
-                - The response text to show to the user
+                - The response text to show to the user (or a chunk iterator when streaming)
                 - Optional automation type if automation is detected
         """
         if not chat_history:
@@ -319,7 +298,6 @@ class GeminiAssistant:
         # Extract all user messages and the latest user message from the formatted chat
         user_messages = []
         latest_message = ""
-        user_id = 1  # Default user ID
         
         # Parse the chat_history to get all user messages and the latest one
         chat_lines = chat_history.strip().split("\n\n")
@@ -337,32 +315,25 @@ class GeminiAssistant:
         if not latest_message:
             return "I didn't receive your message. Could you please try again?", None
             
-        # Check if the message is a greeting in a specific language and update language if needed
-        if self._is_simple_greeting(latest_message):
-            detected_language = self._detect_greeting_language(latest_message)
-            if detected_language != "en":
-                print(f"DETECTED GREETING LANGUAGE: {detected_language}")
-                language = detected_language
+        # Pick the reply language from the script of the message, or from the greeting if it is one
+        detected_language = detect_language(latest_message, language)
+        greeting = self.greeting_matcher.match(latest_message)
+        if greeting and greeting[1]:
+            detected_language = greeting[1]
+        if detected_language != language:
+            print(f"DETECTED LANGUAGE: {detected_language}")
+            language = detected_language
         
         # Get conversation state for this user
-        state = self._get_or_create_conversation_state(user_id)
+        state = await self._get_or_create_conversation_state(user_id)
         
         # Check if this is a simple greeting - if so, reset any ongoing process
-        if self._is_simple_greeting(latest_message):
-            print("GREETING DETECTED! CLEARING CONVERSATION STATE AND REDIS")
+        if greeting:
+            print(f"GREETING DETECTED: '{greeting[0]}'. CLEARING CONVERSATION STATE")
             
-            # Reset the conversation state
+            # Reset the conversation state; saving it below overwrites every stored field that changed
             state.reset()
             
-            # Clear Redis if it's in use
-            if USE_REDIS:
-                try:
-                    # Clear only this user's data
-                    redis_client.delete(f"{REDIS_PREFIX}{user_id}")
-                    print(f"Cleared Redis state for user {user_id}")
-                except Exception as e:
-                    print(f"Error clearing Redis state: {e}")
-            
             # Respond with a friendly greeting in the appropriate language
             greeting_responses = {
                 "en": "Hello! How can I assist you today?",
@@ -384,7 +355,7 @@ class GeminiAssistant:
             response = greeting_responses.get(language, greeting_responses["en"])
             
             # Save the reset conversation state
-            self._save_conversation_state(user_id, state)
+            await self._save_conversation_state(user_id, state)
             return response, None
             
         # Debug the current state
@@ -401,27 +372,45 @@ class GeminiAssistant:
                 # Continue the document creation conversation
                 if state.document_type == AutomationType.PAN_CARD:
                     print("CONTINUING PAN CARD FLOW")
-                    response, complete = await self._continue_pan_card_flow(state, latest_message, language)
+                    response, complete = await self._continue_pan_card_flow(state, latest_message, language, user_id, chat_id)
                     automation_result = AutomationType.PAN_CARD.value if complete else None
                     
                 elif state.document_type == AutomationType.VOTER_ID:
                     print("CONTINUING VOTER ID FLOW")
-                    response, complete = await self._continue_voter_id_flow(state, latest_message, language)
+                    response, complete = await self._continue_voter_id_flow(state, latest_message, language, user_id, chat_id)
                     automation_result = AutomationType.VOTER_ID.value if complete else None
                     
                 elif state.document_type == AutomationType.LEARNER_LICENSE:
                     print("CONTINUING LEARNER LICENSE FLOW")
-                    response, complete = await self._continue_learner_license_flow(state, latest_message, language)
+                    response, complete = await self._continue_learner_license_flow(state, latest_message, language, user_id, chat_id)
                     automation_result = AutomationType.LEARNER_LICENSE.value if complete else None
             
             # If we're not in a document flow, check if this is a new request
             else:
-                # First, detect if this is a freelancer request
-                if await self._is_freelancer_request(chat_history, latest_message):
-                    return "freelancer", None
-                    
-                # Then, check if this is an automation request and which type
-                automation_type, automation_details = await self._detect_automation(chat_history, latest_message)
+                router_reply = ""
+                local_intent = self.intent_classifier.classify(latest_message) if settings.INTENT_CLASSIFIER_ENABLED else None
+                if local_intent:
+                    # Confident local classification, no Gemini call needed to route the message
+                    print(f"LOCAL INTENT: {local_intent}")
+                    if local_intent == FREELANCER_INTENT:
+                        return "freelancer", None
+                    automation_type = AutomationType.NONE if local_intent == CHAT_INTENT else AutomationType(local_intent)
+                    automation_details = {}
+                elif settings.GEMINI_ROUTER_MODE:
+                    # A single structured call classifies the request and drafts the reply; when
+                    # streaming it only classifies, and the reply is streamed by its own call below
+                    response_type, automation_type, automation_details, router_reply = await self._route_request(
+                        chat_history, latest_message, language, draft_reply=not stream
+                    )
+                    if response_type == ResponseType.FREELANCER:
+                        return "freelancer", None
+                else:
+                    # First, detect if this is a freelancer request
+                    if await self._is_freelancer_request(chat_history, latest_message):
+                        return "freelancer", None
+                        
+                    # Then, check if this is an automation request and which type
+                    automation_type, automation_details = await self._detect_automation(chat_history, latest_message)
                 
                 # Start a document creation flow if detected
                 if automation_type != AutomationType.NONE:
@@ -430,6 +419,9 @@ class GeminiAssistant:
                     
                     # Merge any detected details
                     for field, value in automation_details.items():
+                        if field in FIELD_EXTRACTORS and value:
+                            # Keep only values that pass the field's validator
+                            value = FIELD_EXTRACTORS[field](value)
                         if field in state.details and value:
                             state.details[field] = value
                             print(f"SETTING FIELD {field} TO {value}")
@@ -443,6 +435,12 @@ class GeminiAssistant:
                         
                     elif automation_type == AutomationType.LEARNER_LICENSE:
                         response = self._start_document_flow(state, "Learner License")
+                elif router_reply:
+                    # The router already wrote the reply
+                    response = router_reply
+                elif stream:
+                    # Default: Stream a normal AI response, chunks are pulled by the caller
+                    response = self._generate_ai_response_stream(chat_history, latest_message, language)
                 else:
                     # Default: Generate a normal AI response
                     response = await self._generate_ai_response(chat_history, latest_message, language)
@@ -454,7 +452,7 @@ class GeminiAssistant:
                 response = "I apologize, but I'm having trouble processing your request. Please try again in English or contact our support team."
         
         # Save the updated conversation state
-        self._save_conversation_state(user_id, state)
+        await self._save_conversation_state(user_id, state)
         
         # After processing, dump the state for debugging
         print(f"SAVING STATE: Document Type: {state.document_type.value}, Current Field: {state.current_field.value if state.current_field else 'None'}")
@@ -462,6 +460,32 @@ class GeminiAssistant:
                 
         return response, automation_result
 
+    async def process_chat_stream(self, chat_history: str, language: str = "en", user_id: int = 1,
+                                  chat_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Streaming variant of process_chat.
+        
+        Generated AI replies are yielded chunk by chunk as Gemini produces them;
+        greetings, document flow prompts and other fixed replies are yielded as a
+        single chunk.
+        
+        Args:
+            chat_history: String representation of chat messages (see process_chat)
+            language: The preferred language for the response
+            user_id: The user whose document conversation state to use
+            chat_id: The chat that progress of a queued document automation is posted to
+            
+        Yields:
+            Text chunks of the response
+        """
+        response, _ = await self.process_chat(chat_history, language, stream=True, user_id=user_id, chat_id=chat_id)
+        if isinstance(response, str):
+            yield response
+            return
+            
+        async for chunk in response:
+            yield chunk
+
     def _format_chat_for_model(self, chat_history: List[Dict[str, Any]]) -> str:
         """Format chat history for the model in a conversational format."""
         formatted_chat = ""
@@ -482,24 +506,29 @@ class GeminiAssistant:
         state.current_field = DocumentField.NAME
         return f"I'll help you create your {document_name}. Let's collect the necessary information step by step.\n\nFirst, please provide your full name:"
 
-    async def _continue_pan_card_flow(self, state: ConversationState, latest_message: str, language: str) -> Tuple[str, bool]:
+    async def _continue_pan_card_flow(self, state: ConversationState, latest_message: str, language: str,
+                                      user_id: int, chat_id: Optional[str]) -> Tuple[str, bool]:
         """Continue a PAN card creation conversation flow."""
-        return await self._continue_document_flow(state, latest_message, language, "PAN card", make_pan_card)
+        return await self._continue_document_flow(state, latest_message, language, "PAN card", AutomationType.PAN_CARD, user_id, chat_id)
         
-    async def _continue_voter_id_flow(self, state: ConversationState, latest_message: str, language: str) -> Tuple[str, bool]:
+    async def _continue_voter_id_flow(self, state: ConversationState, latest_message: str, language: str,
+                                      user_id: int, chat_id: Optional[str]) -> Tuple[str, bool]:
         """Continue a Voter ID creation conversation flow."""
-        return await self._continue_document_flow(state, latest_message, language, "Voter ID", make_voter_id)
+        return await self._continue_document_flow(state, latest_message, language, "Voter ID", AutomationType.VOTER_ID, user_id, chat_id)
         
-    async def _continue_learner_license_flow(self, state: ConversationState, latest_message: str, language: str) -> Tuple[str, bool]:
+    async def _continue_learner_license_flow(self, state: ConversationState, latest_message: str, language: str,
+                                             user_id: int, chat_id: Optional[str]) -> Tuple[str, bool]:
         """Continue a Learner License creation conversation flow."""
-        return await self._continue_document_flow(state, latest_message, language, "Learner License", make_learner_license)
+        return await self._continue_document_flow(state, latest_message, language, "Learner License", AutomationType.LEARNER_LICENSE, user_id, chat_id)
 
     async def _continue_document_flow(self, 
                                     state: ConversationState, 
                                     latest_message: str, 
                                     language: str,
                                     document_name: str,
-                                    create_document_function) -> Tuple[str, bool]:
+                                    automation_type: AutomationType,
+                                    user_id: int,
+                                    chat_id: Optional[str]) -> Tuple[str, bool]:
         """
         Continue a document creation conversation flow.
         
@@ -508,7 +537,9 @@ class GeminiAssistant:
             latest_message: The latest user message
             language: The preferred language
             document_name: The name of the document being created
-            create_document_function: Function to call to create the document
+            automation_type: The automation job that creates the document
+            user_id: The user the document is for
+            chat_id: The chat to post the automation's progress to
             
         Returns:
             Tuple of (response_message, is_completed)
@@ -533,39 +564,25 @@ class GeminiAssistant:
             is_confirmation = any(keyword in latest_message.lower() for keyword in confirmation_keywords)
             
             if is_confirmation:
-                # Process the document creation
+                # Queue the automation; the browser work runs in the job workers, off this request
                 try:
-                    create_document_function(
-                        name=state.details["name"],
-                        father_name=state.details["father_name"],
-                        dob=state.details["dob"],
-                        email=state.details["email"],
-                        phone=state.details["phone"],
-                        gender=state.details["gender"],
-                        address=state.details["address"],
-                        city=state.details["city"],
-                        state=state.details["state"],
-                        pin_code=state.details["pin_code"]
+                    job = await job_queue.enqueue(
+                        automation_type.value,
+                        dict(state.details),
+                        label=document_name,
+                        chat_id=chat_id,
+                        user_id=user_id
                     )
+                    print(f"QUEUED {document_name} JOB {job['job_id']}")
                     
-                    # Format the success message
-                    response = f"Your {document_name} has been processed with the following details:\n\n" \
-                              f"Name: {state.details['name']}\n" \
-                              f"Father's Name: {state.details['father_name']}\n" \
-                              f"Date of Birth: {state.details['dob']}\n" \
-                              f"Email: {state.details['email']}\n" \
-                              f"Phone: {state.details['phone']}\n" \
-                              f"Gender: {state.details['gender']}\n" \
-                              f"Address: {state.details['address']}\n" \
-                              f"City: {state.details['city']}\n" \
-                              f"State: {state.details['state']}\n" \
-                              f"PIN Code: {state.details['pin_code']}"
+                    response = f"Your {document_name} application has been submitted for processing " \
+                              f"(reference: {job['job_id']}). I'll post an update in this chat when it's done."
                               
                     # Reset the state
                     state.reset()
                     return response, True
                 except Exception as e:
-                    print(f"Error processing {document_name}: {str(e)}")
+                    print(f"Error queueing {document_name}: {str(e)}")
                     return f"There was an error processing your {document_name}. Please try again.", False
             else:
                 # If they didn't confirm, ask again
@@ -579,16 +596,7 @@ class GeminiAssistant:
         # Get the current field before moving to the next one
         current_field = state.current_field.value if state.current_field else DocumentField.NAME.value
             
-        # Use direct extraction for simple responses and model-based extraction for complex ones
-        extracted_value = ""
-        
-        # For simple responses that are likely just the answer to our question
-        if len(latest_message.split()) <= 5 and not any(q in latest_message.lower() for q in ["what", "how", "why", "when", "?"]):
-            extracted_value = latest_message.strip()
-            print(f"DIRECT EXTRACTION for {current_field}: '{extracted_value}'")
-        else:
-            # Use model-based extraction for more complex responses
-            extracted_value = await self._extract_field_value(latest_message, current_field)
+        extracted_value = await self._extract_field_value(latest_message, current_field)
             
         # Update the state with the extracted information if we got something
         if extracted_value and current_field in state.details:
@@ -601,6 +609,9 @@ class GeminiAssistant:
         else:
             print(f"FAILED TO EXTRACT VALUE for {current_field}")
             # If extraction failed, ask for the same field again
+            if current_field in FIELD_EXTRACTORS:
+                response, completed = self._get_next_field_prompt(state, document_name)
+                return f"Sorry, that doesn't look like a valid {current_field.replace('_', ' ')}. {response}", completed
             
         # Return the prompt for the new current field
         return self._get_next_field_prompt(state, document_name)
@@ -648,9 +659,145 @@ class GeminiAssistant:
         
         return field_prompts.get(current_field, "Please continue providing your details:"), False
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=3))
+    @staticmethod
+    def _is_context_free(chat_history: str) -> bool:
+        """Whether the chat history is only the latest message, so the answer can be shared between users"""
+        return len(chat_history.strip().split("\n\n")) == 1
+
+    def _cache_key(self, prompt: str, language: str = "", generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """LLM cache key for a prompt, language and model configuration"""
+        model_config = self.model_config_key
+        if generation_config:
+            model_config += json.dumps(generation_config, sort_keys=True)
+        return prompt_fingerprint(prompt, language, model_config)
+
+    def _flight_key(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """Single-flight key: the exact prompt and configuration, unlike the normalised cache key"""
+        config = json.dumps(generation_config, sort_keys=True) if generation_config else ""
+        return hashlib.sha256(f"{self.model_config_key}\x00{config}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    async def _generate_text(self, prompt: str, cache_kind: Optional[str] = None, language: str = "",
+                             generation_config: Optional[Dict[str, Any]] = None,
+                             priority: Priority = Priority.USER) -> str:
+        """
+        Run a prompt through Gemini and return the response text.
+        
+        The call goes through the process-wide LLM scheduler. With a cache_kind
+        ("classification" or "faq") the result is looked up in and stored to the
+        LLM cache under that kind's TTL. Callers sending exactly the same prompt
+        while it is in flight share its call; prompts that only match after the
+        cache's case and whitespace normalisation don't.
+        """
+        cache_key = self._cache_key(prompt, language, generation_config)
+        use_cache = cache_kind and settings.LLM_CACHE_ENABLED
+        if use_cache:
+            cached = await self.llm_cache.get(cache_kind, cache_key)
+            if cached is not None:
+                return cached
+        
+        async def generate() -> str:
+            response = await llm_scheduler.run(
+                lambda: self.model.generate_content_async(prompt, generation_config=generation_config),
+                priority
+            )
+            text = response.text
+            if use_cache:
+                await self.llm_cache.set(cache_kind, cache_key, text)
+            return text
+        
+        return await self.in_flight.do(self._flight_key(prompt, generation_config), generate)
+
+    async def _route_request(self, chat_history: str, latest_message: str, language: str,
+                             draft_reply: bool = True) -> Tuple[ResponseType, AutomationType, Dict[str, str], str]:
+        """
+        Classify a new request and draft the reply in a single structured-output call.
+        
+        Replaces the sequence of _is_freelancer_request, _detect_automation and
+        _generate_ai_response calls in router mode. With draft_reply=False (streamed
+        replies) the call only classifies and the reply is left empty, so the caller
+        streams it with _generate_ai_response_stream.
+        
+        Returns:
+            Tuple of (response type, automation type, extracted document details, reply text).
+            On failure the request is treated as a normal chat with an empty reply,
+            so the caller falls back to _generate_ai_response.
+        """
+        language = language.lower()
+        language_instruction, script_instruction = self._get_language_instructions(language)
+        if draft_reply:
+            reply_instruction = f"""If the intent is "ai_response", write a concise, helpful and friendly reply to the user in "reply".
+        {language_instruction}
+        Respond in this language: {language}
+        {script_instruction}"""
+        else:
+            reply_instruction = 'Leave "reply" empty.'
+        prompt = f"""
+        You are the request router and customer support assistant for a Digital Common Service Center.
+        
+        Chat history:
+        {chat_history}
+        
+        Latest user message:
+        {latest_message}
+        
+        Decide the intent of the latest user message:
+        - "freelancer": the user EXPLICITLY asks for a freelancer or clearly needs one of these services:
+          {', '.join(self.freelancer_tasks)}.
+          Email addresses, phone numbers, names and other personal information are NEVER freelancer requests.
+        - "automation": the user wants one of these registrations: PAN card ("pan_card"), Voter ID ("voter_id"),
+          Learner license ("learner_license"). Set "automation_type" accordingly.
+        - "ai_response": anything else, including greetings and general questions.
+        
+        Put any details the user has already given (name, father_name, dob, email, phone, gender, address,
+        city, state, pin_code) into "details".
+        
+        {reply_instruction}
+        """
+        
+        try:
+            result = await self._generate_text(
+                prompt,
+                cache_kind="faq" if self._is_context_free(chat_history) else None,
+                language=language,
+                generation_config={
+                    "response_mime_type": "application/json",
+                    "response_schema": ROUTER_RESPONSE_SCHEMA,
+                }
+            )
+            analysis = json.loads(result)
+            response_type = ResponseType(analysis.get("intent", ResponseType.AI_RESPONSE.value))
+            automation_type = AutomationType(analysis.get("automation_type", AutomationType.NONE.value))
+            if response_type != ResponseType.AUTOMATION:
+                automation_type = AutomationType.NONE
+            details = {field: value for field, value in analysis.get("details", {}).items() if value}
+            print(f"ROUTER RESULT: {response_type.value}, {automation_type.value}, {details}")
+            return response_type, automation_type, details, analysis.get("reply", "").strip()
+        except Exception as e:
+            print(f"Error routing request: {e}")
+            return ResponseType.AI_RESPONSE, AutomationType.NONE, {}, ""
+
     async def _extract_field_value(self, message: str, field: str) -> str:
-        """Extract a specific field value from a user message."""
+        """
+        Extract a specific field value from a user message.
+        
+        Fields in FIELD_EXTRACTORS are extracted and normalised locally; Gemini is
+        only asked when that fails, and its answer has to pass the same extractor.
+        Other fields use short answers directly and ask Gemini for longer ones.
+        
+        Returns:
+            The field value, or an empty string if no valid value was found
+        """
+        extractor = FIELD_EXTRACTORS.get(field)
+        if extractor:
+            value = extractor(message)
+            if value:
+                print(f"LOCAL EXTRACTION for {field}: '{value}'")
+                return value
+        # For simple responses, just use the message directly if it's likely to be the field value
+        elif len(message.split()) <= 5 and not any(q in message.lower() for q in ["what", "how", "why", "when", "?"]):
+            print(f"DIRECT EXTRACTION for {field}: '{message}'")
+            return message.strip()
+        
         field_descriptions = {
             "name": "the person's full name",
             "father_name": "the person's father's name",
@@ -664,11 +811,6 @@ class GeminiAssistant:
             "pin_code": "the PIN or postal code"
         }
         
-        # For simple responses, just use the message directly if it's likely to be the field value
-        if len(message.split()) <= 5 and not any(q in message.lower() for q in ["what", "how", "why", "when", "?"]):
-            print(f"DIRECT EXTRACTION for {field}: '{message}'")
-            return message.strip()
-        
         prompt = f"""
         Extract {field_descriptions.get(field, field)} from this message:
         
@@ -678,15 +820,19 @@ class GeminiAssistant:
         """
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            result = response.text.strip()
+            # Not cached: the answer is the user's own personal data, and the
+            # cache key ignores case, which names and addresses depend on
+            result = (await self._generate_text(prompt)).strip()
             print(f"EXTRACTION RESULT for {field}: '{result}'")
+            if extractor and result:
+                # Don't let an invalid value through to the automation
+                result = extractor(result) or ""
             return result
         except Exception as e:
             print(f"Error extracting field value: {e}")
-            return message.strip()  # Fall back to the message itself if extraction fails
+            # Fall back to the message itself if extraction fails, unless it has been found invalid
+            return "" if extractor else message.strip()
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=3))
     async def _is_freelancer_request(self, chat_history: str, latest_message: str) -> bool:
         """Determine if the user is requesting a freelancer."""
         # First, check if the message is likely just an email address or other personal info
@@ -723,8 +869,7 @@ class GeminiAssistant:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            result = response.text.strip().upper()
+            result = (await self._generate_text(prompt, cache_kind="classification")).strip().upper()
             print(f"Freelancer detection result: {result} for input: {latest_message[:30]}...")
             return result == "YES"
         except Exception as e:
@@ -732,7 +877,6 @@ class GeminiAssistant:
             # Be cautious - if we can't determine, don't send to freelancer
             return False
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=3)) 
     async def _detect_automation(self, chat_history: str, latest_message: str) -> Tuple[AutomationType, Dict[str, Any]]:
         """Detect if the conversation requires automation and which type."""
         prompt = f"""
@@ -754,21 +898,13 @@ class GeminiAssistant:
         """
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            result = response.text
-            
-            # Extract JSON from response
-            try:
-                # Try parsing as-is first
-                analysis = json.loads(result)
-            except json.JSONDecodeError:
-                # If that fails, try to extract JSON from markdown code block
-                if "```json" in result and "```" in result:
-                    json_text = result.split("```json")[1].split("```")[0].strip()
-                    analysis = json.loads(json_text)
-                else:
-                    # Fall back if JSON parsing fails
-                    return AutomationType.NONE, {}
+            # JSON mode makes the model return bare JSON, without markdown fences to strip
+            result = await self._generate_text(
+                prompt,
+                cache_kind="classification",
+                generation_config={"response_mime_type": "application/json"}
+            )
+            analysis = json.loads(result)
             
             automation_type = analysis.get("type", "none")
             details = analysis.get("details", {})
@@ -786,16 +922,40 @@ class GeminiAssistant:
             print(f"Error in automation detection: {e}")
             return AutomationType.NONE, {}
 
-    @retry(stop=stop_after_attempt(2), wait=wait_exponential(multiplier=1, min=1, max=3))
-    async def _generate_ai_response(self, chat_history: str, latest_message: str, language: str) -> str:
-        """Generate an AI response to a user message."""
+    async def summarize_conversation(self, previous_summary: Optional[str], chat_history: str) -> str:
+        """
+        Fold older chat messages into a rolling conversation summary.
+        
+        Args:
+            previous_summary: The summary so far, if any
+            chat_history: The messages to add to it, formatted as "Role: Message\n\n"
+            
+        Returns:
+            The updated summary
+        """
+        prompt = f"""
+        You maintain a running summary of a customer support chat at a Digital Common Service Center.
+        Update the summary with the new messages below.
+        
+        Current summary:
+        {previous_summary or "(none)"}
+        
+        New messages:
+        {chat_history}
+        
+        Keep every detail the user has provided (names, dates, numbers, addresses), what they asked for,
+        and anything still unresolved. Write at most 120 words, in the language used in the conversation.
+        Return ONLY the summary text.
+        """
+        
+        return (await self._generate_text(prompt, priority=Priority.BACKGROUND)).strip()
+
+    def _get_language_instructions(self, language: str) -> Tuple[str, str]:
+        """Get the (language, script) instructions for a response language."""
         # Handle Kumaoni/Garhwali/Hindi by instructing to use Devanagari script
         script_instruction = ""
         language_instruction = ""
         
-        # Normalize language value
-        language = language.lower()
-        
         # Special handling for Hindi, Kumaoni and Gharwali
         if language in ["kumaoni", "garhwali", "gharwali", "hindi", "hi"]:
             # For Kumaoni/Garhwali, specify to use Devanagari script
@@ -814,8 +974,13 @@ class GeminiAssistant:
                 Even if the user writes in English or another language, your response should be in Hindi.
                 This is extremely important for user satisfaction.
                 """
-            
-        prompt = f"""
+        
+        return language_instruction, script_instruction
+
+    def _build_response_prompt(self, chat_history: str, latest_message: str, language: str) -> str:
+        """Build the prompt used to generate an AI response to a user message."""
+        language_instruction, script_instruction = self._get_language_instructions(language)
+        return f"""
         You are a helpful customer support assistant for a Digital Common Service Center. 
         Respond to the following chat conversation.
         Be concise, helpful, and friendly.
@@ -834,10 +999,29 @@ class GeminiAssistant:
         custom application development, logo design, API development etc., respond ONLY with the word 'freelancer'.
         DO NOT interpret email addresses or other personal information as freelancer requests.
         """
+
+    def _get_response_error_message(self, language: str) -> Optional[str]:
+        """Get the apology shown when a response cannot be generated, None for English."""
+        if language in ["hindi", "hi"]:
+            return "माफ़ कीजिए, मुझे आपके अनुरोध को संसाधित करने में समस्या हो रही है। कृपया फिर से प्रयास करें या सहायता के लिए संपर्क करें।"
+        elif language == "kumaoni":
+            return "माफी चाहन्छु, मलाई तपाईंको अनुरोध प्रशोधन गर्न समस्या भइरहेको छ। कृपया फेरि प्रयास गर्नुहोस् वा सहयोगको लागि सम्पर्क गर्नुहोस्।"
+        elif language in ["garhwali", "gharwali"]:
+            return "माफ करा, मी आपल्या विनंतीवर प्रक्रिया करण्यात अडचण येत आहे. कृपया पुन्हा प्रयत्न करा किंवा मदतीसाठी संपर्क साधा."
+        return None
+
+    async def _generate_ai_response(self, chat_history: str, latest_message: str, language: str) -> str:
+        """Generate an AI response to a user message."""
+        # Normalize language value
+        language = language.lower()
+        prompt = self._build_response_prompt(chat_history, latest_message, language)
         
         try:
-            response = await self.model.generate_content_async(prompt)
-            result = response.text.strip()
+            result = (await self._generate_text(
+                prompt,
+                cache_kind="faq" if self._is_context_free(chat_history) else None,
+                language=language
+            )).strip()
             
             # Check if this is a freelancer request that slipped through
             if result.lower() == "freelancer":
@@ -847,11 +1031,106 @@ class GeminiAssistant:
         except Exception as e:
             print(f"Error generating AI response: {e}")
             # Provide error messages in the appropriate language
-            if language in ["hindi", "hi"]:
-                return "माफ़ कीजिए, मुझे आपके अनुरोध को संसाधित करने में समस्या हो रही है। कृपया फिर से प्रयास करें या सहायता के लिए संपर्क करें।"
-            elif language == "kumaoni":
-                return "माफी चाहन्छु, मलाई तपाईंको अनुरोध प्रशोधन गर्न समस्या भइरहेको छ। कृपया फेरि प्रयास गर्नुहोस् वा सहयोगको लागि सम्पर्क गर्नुहोस्।"
-            elif language in ["garhwali", "gharwali"]:
-                return "माफ करा, मी आपल्या विनंतीवर प्रक्रिया करण्यात अडचण येत आहे. कृपया पुन्हा प्रयत्न करा किंवा मदतीसाठी संपर्क साधा."
-            else:
+            error_message = self._get_response_error_message(language)
+            if error_message is None:
                 raise
+            return error_message
+
+    async def _generate_ai_response_stream(self, chat_history: str, latest_message: str, language: str) -> AsyncIterator[str]:
+        """
+        Generate an AI response to a user message, yielding text chunks as they arrive.
+        
+        Unlike _generate_ai_response this is not retried: once the first chunk has
+        been sent to the client the reply cannot be restarted. If the stream fails
+        before anything was yielded, an apology is yielded instead.
+        """
+        # Normalize language value
+        language = language.lower()
+        prompt = self._build_response_prompt(chat_history, latest_message, language)
+        
+        # A cached context-free answer is sent as a single chunk
+        cache_key = None
+        if settings.LLM_CACHE_ENABLED and self._is_context_free(chat_history):
+            cache_key = self._cache_key(prompt, language)
+            cached = await self.llm_cache.get("faq", cache_key)
+            if cached is not None:
+                yield cached.strip()
+                return
+        
+        yielded = False
+        chunks = []
+        try:
+            # The scheduler slot is held until the stream is finished
+            async with llm_scheduler.slot():
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    text = chunk.text
+                    if text:
+                        # Strip leading whitespace of the reply, as the non-streaming path does
+                        if not yielded:
+                            text = text.lstrip()
+                            if not text:
+                                continue
+                        yielded = True
+                        chunks.append(text)
+                        yield text
+            if cache_key and chunks:
+                await self.llm_cache.set("faq", cache_key, "".join(chunks))
+        except Exception as e:
+            print(f"Error streaming AI response: {e}")
+            if not yielded:
+                yield self._get_response_error_message(language) or \
+                    "I'm sorry, I encountered an issue while processing your request. Please try again or contact support."
+
+def format_document_details(details: Dict[str, str]) -> str:
+    """Format collected document details, one per line"""
+    return f"Name: {details.get('name', '')}\n" \
+           f"Father's Name: {details.get('father_name', '')}\n" \
+           f"Date of Birth: {details.get('dob', '')}\n" \
+           f"Email: {details.get('email', '')}\n" \
+           f"Phone: {details.get('phone', '')}\n" \
+           f"Gender: {details.get('gender', '')}\n" \
+           f"Address: {details.get('address', '')}\n" \
+           f"City: {details.get('city', '')}\n" \
+           f"State: {details.get('state', '')}\n" \
+           f"PIN Code: {details.get('pin_code', '')}"
+
+async def post_job_update(job: Dict[str, Any]):
+    """
+    Post the outcome of a document automation job into its chat.
+    
+    Only finished jobs are posted; a job can start before the reply that
+    queued it has been stored, and the status API shows it running.
+    """
+    if not job.get("chat_id") or job.get("user_id") is None:
+        return
+    
+    status = job["status"]
+    if status == JobStatus.COMPLETED.value:
+        text = f"Your {job['label']} has been processed with the following details:\n\n" \
+               f"{format_document_details(job['payload'])}"
+    elif status == JobStatus.FAILED.value:
+        text = f"There was an error processing your {job['label']}. Please try again."
+    else:
+        return
+    
+    message = ChatMessage(user_id=job["user_id"], sent_from=MessageSender.AI, type=MessageType.TEXT, text=text)
+    await get_chat_repository().add_messages(job["chat_id"], [message])
+
+# Document automations run as background jobs, see app.utils.job_queue
+job_queue.register(AutomationType.PAN_CARD.value, make_pan_card)
+job_queue.register(AutomationType.VOTER_ID.value, make_voter_id)
+job_queue.register(AutomationType.LEARNER_LICENSE.value, make_learner_license)
+job_queue.on_update(post_job_update)
+
+gemini_assistant: Optional[GeminiAssistant] = None
+
+async def init_gemini_assistant():
+    """Create and warm up the process-wide Gemini assistant"""
+    global gemini_assistant
+    gemini_assistant = GeminiAssistant()
+    await gemini_assistant.warm_up()
+
+def get_gemini_assistant() -> GeminiAssistant:
+    """Get the process-wide Gemini assistant, for use as a route dependency"""
+    return gemini_assistant
@@ -0,0 +1,190 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Intent labels, matching the AutomationType values plus freelancer and chat
+FREELANCER = "freelancer"
+PAN_CARD = "pan_card"
+VOTER_ID = "voter_id"
+LEARNER_LICENSE = "learner_license"
+CHAT = "chat"
+
+# Longer messages usually carry details (name, DOB, ...) that only the LLM
+# extracts, so they are always left to it
+MAX_WORDS = 12
+
+# Log the hit rate every this many classifications
+STATS_LOG_INTERVAL = 500
+
+# (pattern, weight) rules per intent, for English, Hindi and romanised Hindi.
+# The scores of all matching rules are added up and capped at 1.0.
+INTENT_RULES: Dict[str, List[Tuple[str, float]]] = {
+    PAN_CARD: [
+        (r"\bpan\s*-?\s*card\b", 1.0),
+        (r"\bpan\b", 0.6),
+        (r"पैन\s*कार्ड", 1.0),
+        (r"पैन", 0.6),
+        (r"\bpermanent account number\b", 1.0),
+    ],
+    VOTER_ID: [
+        (r"\bvoter\s*(id|card|i\.?d\.?)\b", 1.0),
+        (r"\bvoter\b", 0.7),
+        (r"\b(epic|election|chunav)\s*card\b", 1.0),
+        (r"\bmatdata\b", 0.8),
+        (r"वोटर\s*(आईडी|आई\s*डी|कार्ड)", 1.0),
+        (r"वोटर|मतदाता", 0.8),
+        (r"मतदाता\s*पहचान\s*पत्र|चुनाव\s*कार्ड", 1.0),
+    ],
+    LEARNER_LICENSE: [
+        (r"\blearn(er|ers|ing)?'?s?\s*(driving\s*)?(licen[cs]e|lic)\b", 1.0),
+        (r"\bdriving\s*licen[cs]e\b", 0.9),
+        (r"लर्नर\s*(ड्राइविंग\s*)?लाइसेंस", 1.0),
+        (r"ड्राइविंग\s*लाइसेंस", 0.9),
+    ],
+    FREELANCER: [
+        (r"\bfreelanc(er|ers|ing)\b", 1.0),
+        (r"फ्रीलांसर", 1.0),
+        # Service words alone ("what is your website?") aren't requests
+        (r"\b(website|web\s*site|web\s*app|mobile\s*app|android\s*app)\b", 0.6),
+        (r"\blogo\b", 0.6),
+        (r"\b(custom\s+(application|app|report)|api\s+development|data\s+migration|security\s+audit)\b", 0.9),
+        (r"वेबसाइट|लोगो|ऐप", 0.6),
+    ],
+    CHAT: [
+        # The whole message is an acknowledgement or thanks
+        (r"^(yes|yeah|yep|no|nope|ok|okay|thanks|thank\s*you|thank\s*u|thx|haan|han|ha|nahi|nahin|"
+         r"theek\s*hai|thik\s*hai|accha|achha|shukriya|dhanyavaad|dhanyawad|dhanyavad|"
+         r"हाँ|हां|जी|नहीं|ठीक\s*है|अच्छा|धन्यवाद|शुक्रिया)[\s.!?]*$", 1.0),
+    ],
+}
+
+# Words showing the user wants something done; they add to the confidence of a
+# document or freelancer intent, and document intents need one
+REQUEST_PATTERN = re.compile(
+    r"\b(need|want|apply|applying|make|create|get|new|register|registration|build|design|develop|"
+    r"chahiye|chaiye|banwana|banvana|banana|banani|banwani|banao|apply\s*karna)\b"
+    r"|चाहिए|बनवाना|बनवानी|बनाना|बनानी|बनाओ|आवेदन|अप्लाई",
+    re.IGNORECASE
+)
+REQUEST_BOOST = 0.2
+
+# Document intents start a new-application form and a freelancer intent hands
+# the user over to a freelancer, so without a request word ("pan card", "mera
+# voter card") they are capped below any useful threshold
+DOCUMENT_INTENTS = (PAN_CARD, VOTER_ID, LEARNER_LICENSE)
+SERVICE_INTENTS = DOCUMENT_INTENTS + (FREELANCER,)
+NO_REQUEST_CAP = 0.5
+
+# Messages about something the user already has (status, update, lost card,
+# renewal, "check my website") are not new requests
+NOT_NEW_APPLICATION_PATTERN = re.compile(
+    r"\b(status|track|check|updat(e|ion)|correct(ion)?|change|edit|fix|lost|kho\s*(gaya|gayi|gya)|"
+    r"chori|stolen|damaged?|renew(al)?|duplicate|reprint|link)\b"
+    r"|स्थिति|अपडेट|सुधार|बदल|खो\s*गया|खो\s*गई|नवीनीकरण|रिन्यू",
+    re.IGNORECASE
+)
+# Licences other than the learner's (trade/shop licence) are not ours either
+OTHER_LICENCE_PATTERN = re.compile(
+    r"\b(trade|shop|business|dukaan|dukan|firm|fssai|gst)\b|दुकान|व्यापार",
+    re.IGNORECASE
+)
+NOT_NEW_APPLICATION_PENALTY = 0.6
+
+# Questions about a service ("what documents do I need for a PAN card?") are
+# FAQs for the LLM to answer, not requests to start a form
+QUESTION_PATTERN = re.compile(
+    r"\?|\b(what|which|how|why|when|where|who|kya|kaise|kaun|kab|kahan|kitna|kitne|kyun)\b"
+    r"|क्या|कैसे|कौन|कब|कहाँ|कितना|कितने|क्यों",
+    re.IGNORECASE
+)
+QUESTION_PENALTY = 0.5
+
+
+class IntentClassifier:
+    """
+    Local rule-based intent classifier that runs ahead of the Gemini calls.
+
+    Short messages such as "I need a PAN card" or "voter id banwana hai" are
+    classified with keyword and regex rules. A result is only returned when its
+    confidence reaches the threshold; otherwise the caller falls back to the
+    LLM. Hits and fallbacks are counted in `stats`.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self.rules = {
+            intent: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+            for intent, rules in INTENT_RULES.items()
+        }
+        self.stats = {"hits": 0, "fallbacks": 0}
+        self.intent_hits = {intent: 0 for intent in INTENT_RULES}
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of classified messages that didn't need the LLM"""
+        total = self.stats["hits"] + self.stats["fallbacks"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def score(self, message: str) -> Tuple[Optional[str], float]:
+        """
+        Score a message against the rules.
+
+        Returns:
+            Tuple of (best intent or None, confidence between 0 and 1)
+        """
+        text = message.strip()
+        if not text or len(text.split()) > MAX_WORDS:
+            return None, 0.0
+
+        scores = {}
+        for intent, rules in self.rules.items():
+            score = sum(weight for pattern, weight in rules if pattern.search(text))
+            if score:
+                scores[intent] = min(score, 1.0)
+        if not scores:
+            return None, 0.0
+
+        has_request = bool(REQUEST_PATTERN.search(text))
+        adjustment = 0.0
+        if has_request:
+            adjustment += REQUEST_BOOST
+        if QUESTION_PATTERN.search(text):
+            adjustment -= QUESTION_PENALTY
+        not_new_application = bool(NOT_NEW_APPLICATION_PATTERN.search(text))
+        other_licence = bool(OTHER_LICENCE_PATTERN.search(text))
+        for intent in scores:
+            if intent == CHAT:
+                continue
+            score = scores[intent] + adjustment
+            if intent in SERVICE_INTENTS:
+                if not_new_application or (other_licence and intent in DOCUMENT_INTENTS):
+                    score -= NOT_NEW_APPLICATION_PENALTY
+                if not has_request:
+                    score = min(score, NO_REQUEST_CAP)
+            scores[intent] = max(min(score, 1.0), 0.0)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        intent, confidence = ranked[0]
+        # A message matching several intents is ambiguous
+        if len(ranked) > 1:
+            confidence -= ranked[1][1]
+        return intent, confidence
+
+    def classify(self, message: str) -> Optional[str]:
+        """
+        Classify a message if the rules are confident enough.
+
+        Returns:
+            The intent label (see INTENT_RULES), or None to fall back to the LLM
+        """
+        intent, confidence = self.score(message)
+        if intent and confidence >= self.threshold:
+            self.stats["hits"] += 1
+            self.intent_hits[intent] += 1
+        else:
+            intent = None
+            self.stats["fallbacks"] += 1
+
+        total = self.stats["hits"] + self.stats["fallbacks"]
+        if total % STATS_LOG_INTERVAL == 0:
+            print(f"Intent classifier: {self.hit_rate:.1%} of {total} messages classified locally, {self.intent_hits}")
+        return intent
@@ -0,0 +1,246 @@
+import asyncio
+import inspect
+import json
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from app.core.config import settings
+from app.db.redis import get_redis
+from app.schemas.job import JobStatus
+
+QUEUE_KEY = "automation_jobs:queue"
+JOB_PREFIX = "automation_job:"
+
+class JobQueue:
+    """
+    Queue of background jobs, such as the Selenium document automations, run
+    by a pool of workers outside the request that created them.
+
+    Jobs are stored as Redis hashes and queued on a Redis list, so any process
+    running workers (see app.worker) can pick them up. Without Redis, jobs are
+    queued in process memory and run by this process's workers. Handlers are
+    blocking functions and run in threads; every status change is passed to
+    the registered update callbacks, e.g. to post progress into the chat.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._update_callbacks: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._memory_jobs: Dict[str, Dict[str, Any]] = {}
+        self._memory_pending: Deque[str] = deque()
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def register(self, job_type: str, handler: Callable[..., Any]):
+        """
+        Register the blocking function that runs jobs of a type. The job fails
+        if the handler raises or returns a falsy value (False or None).
+        """
+        self._handlers[job_type] = handler
+
+    def get_handler(self, job_type: str) -> Optional[Callable[..., Any]]:
+        """The function registered for a job type, or None"""
+        return self._handlers.get(job_type)
+
+    def on_update(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """Register an async callback called with the job after every status change"""
+        self._update_callbacks.append(callback)
+
+    async def start(self, workers: int):
+        """Start the worker pool; call after connect_to_redis()"""
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        if workers:
+            print(f"Job queue started with {workers} workers")
+        elif not get_redis():
+            print("Warning: Job queue has no workers and no Redis; queued jobs won't run")
+
+    async def close(self):
+        """Stop the workers; running handler threads finish on their own"""
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], label: str = "",
+                      chat_id: Optional[str] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Queue a job and return it; the handler is called with the payload as keyword arguments"""
+        now = datetime.now()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "type": job_type,
+            "label": label or job_type,
+            "status": JobStatus.QUEUED.value,
+            "payload": payload,
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.hset(f"{JOB_PREFIX}{job['job_id']}", mapping=self._to_hash(job))
+                    pipe.expire(f"{JOB_PREFIX}{job['job_id']}", settings.JOB_TTL)
+                    pipe.lpush(QUEUE_KEY, job["job_id"])
+                    await pipe.execute()
+                self._wakeup.set()
+                return job
+            except Exception as e:
+                print(f"Error queueing job in Redis, queueing in memory: {e}")
+
+        self._memory_jobs[job["job_id"]] = job
+        self._memory_pending.append(job["job_id"])
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id, or None if it is unknown or expired"""
+        if job_id in self._memory_jobs:
+            return self._memory_jobs[job_id]
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                data = await redis_client.hgetall(f"{JOB_PREFIX}{job_id}")
+            except Exception as e:
+                print(f"Error loading job {job_id}: {e}")
+                return None
+            if data:
+                return self._from_hash(data)
+        return None
+
+    async def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get many jobs by id in one Redis round trip; unknown or expired jobs are left out"""
+        jobs = {job_id: self._memory_jobs[job_id] for job_id in job_ids if job_id in self._memory_jobs}
+        remaining = [job_id for job_id in job_ids if job_id not in jobs]
+        redis_client = get_redis()
+        if remaining and redis_client:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for job_id in remaining:
+                        pipe.hgetall(f"{JOB_PREFIX}{job_id}")
+                    results = await pipe.execute()
+            except Exception as e:
+                print(f"Error loading jobs: {e}")
+                return jobs
+            for job_id, data in zip(remaining, results):
+                if data:
+                    jobs[job_id] = self._from_hash(data)
+        return jobs
+
+    @staticmethod
+    def _to_hash(job: Dict[str, Any]) -> Dict[str, str]:
+        fields = {key: value for key, value in job.items() if value is not None}
+        fields["payload"] = json.dumps(job["payload"])
+        fields["created_at"] = job["created_at"].isoformat()
+        fields["updated_at"] = job["updated_at"].isoformat()
+        if job["user_id"] is not None:
+            fields["user_id"] = str(job["user_id"])
+        return fields
+
+    @staticmethod
+    def _from_hash(data: Dict[Any, Any]) -> Dict[str, Any]:
+        fields = {
+            (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+            for key, value in data.items()
+        }
+        return {
+            "job_id": fields["job_id"],
+            "type": fields["type"],
+            "label": fields.get("label", fields["type"]),
+            "status": fields["status"],
+            "payload": json.loads(fields.get("payload", "{}")),
+            "chat_id": fields.get("chat_id"),
+            "user_id": int(fields["user_id"]) if fields.get("user_id") else None,
+            "error": fields.get("error"),
+            "created_at": datetime.fromisoformat(fields["created_at"]),
+            "updated_at": datetime.fromisoformat(fields["updated_at"]),
+        }
+
+    async def _update(self, job: Dict[str, Any], **changes):
+        """Apply a status change, store it and notify the update callbacks"""
+        job.update(changes, updated_at=datetime.now())
+        if job["job_id"] not in self._memory_jobs:
+            redis_client = get_redis()
+            if redis_client:
+                try:
+                    fields = {key: value for key, value in self._to_hash(job).items() if key in changes or key == "updated_at"}
+                    await redis_client.hset(f"{JOB_PREFIX}{job['job_id']}", mapping=fields)
+                except Exception as e:
+                    print(f"Error updating job {job['job_id']}: {e}")
+
+        for callback in self._update_callbacks:
+            try:
+                await callback(job)
+            except Exception as e:
+                print(f"Error in job update callback: {e}")
+
+    async def _pop(self) -> Optional[str]:
+        """Take the next queued job id, local jobs first"""
+        if self._memory_pending:
+            return self._memory_pending.popleft()
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                job_id = await redis_client.rpop(QUEUE_KEY)
+            except Exception as e:
+                print(f"Error taking job from Redis: {e}")
+                return None
+            if job_id is not None:
+                return job_id.decode() if isinstance(job_id, bytes) else job_id
+        return None
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            job_id = await self._pop()
+            if job_id is None:
+                # Woken up early by jobs queued in this process; jobs queued elsewhere are polled
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = await self.get_job(job_id)
+            if job:
+                await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        handler = self._handlers.get(job["type"])
+        if handler is None:
+            await self._update(job, status=JobStatus.FAILED.value, error=f"No handler for job type {job['type']}")
+            return
+
+        await self._update(job, status=JobStatus.RUNNING.value)
+        try:
+            # Blocking automations (Selenium) run in a thread, off the event loop
+            result = await asyncio.to_thread(handler, **self._handler_arguments(handler, job["payload"]))
+            if not result:
+                # The automations catch their own errors and report failure by returning False
+                raise RuntimeError(f"{job['label']} automation did not complete")
+            await self._update(job, status=JobStatus.COMPLETED.value)
+        except Exception as e:
+            print(f"Job {job['job_id']} ({job['type']}) failed: {e}")
+            await self._update(job, status=JobStatus.FAILED.value, error=str(e))
+        if job["job_id"] in self._memory_jobs:
+            # Finished in-memory jobs stay visible to the status API as long as Redis would keep them
+            asyncio.get_running_loop().call_later(settings.JOB_TTL, self._memory_jobs.pop, job["job_id"], None)
+
+    @staticmethod
+    def _handler_arguments(handler: Callable[..., Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """The payload entries the handler accepts, so one payload can serve handlers with different fields"""
+        parameters = inspect.signature(handler).parameters
+        if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters.values()):
+            return payload
+        return {key: value for key, value in payload.items() if key in parameters}
+
+# Process-wide job queue
+job_queue = JobQueue()
@@ -0,0 +1,184 @@
+import bisect
+import string
+from typing import Dict, List, Optional, Tuple
+
+# Greetings and the reply language each one implies. None means the greeting
+# says nothing about the language, so the script of the message decides.
+GREETINGS: Dict[str, Optional[str]] = {
+    # English, used by speakers of every language, so the preferred language is kept
+    "hello": None, "hi": None, "hey": None, "good morning": None, "good afternoon": None,
+    "good evening": None, "greetings": None, "welcome": None,
+    # Hindi, also romanised
+    "namaste": "hindi", "namastey": "hindi", "namaskar": "hindi", "namaskaar": "hindi",
+    "pranaam": "hindi", "ram ram": "hindi",
+    "नमस्ते": "hindi", "नमस्कार": "hindi", "प्रणाम": "hindi", "सुप्रभात": "hindi", "शुभ दिन": "hindi",
+    "राम राम": "hindi", "जय हो": "hindi", "सत श्री अकाल": "hindi", "नमो नमः": "hindi",
+    # Kumaoni
+    "जय बो": "kumaoni",
+    # Garhwali
+    "जय भगवान": "gharwali", "जय बदरी विशाल": "gharwali",
+    # Other Indian languages
+    "वणक्कम्": None, "अदाब": None,
+    # Spanish
+    "hola": "es", "buenos días": "es", "buenas tardes": "es", "buenas noches": "es",
+    # French
+    "bonjour": "fr", "salut": "fr", "bonsoir": "fr",
+    # German
+    "hallo": "de", "guten tag": "de", "guten morgen": "de",
+    # Italian
+    "ciao": "it", "buongiorno": "it", "salve": "it",
+    # Portuguese
+    "olá": "pt", "bom dia": "pt", "boa tarde": "pt",
+    # Russian
+    "привет": "ru", "здравствуйте": "ru", "добрый день": "ru",
+    # Japanese
+    "こんにちは": "ja", "おはよう": "ja", "こんばんは": "ja",
+    # Chinese
+    "你好": "zh", "早上好": "zh", "晚上好": "zh",
+    # Arabic
+    "مرحبا": "ar", "السلام عليكم": "ar", "صباح الخير": "ar",
+}
+
+# Only messages of at most this many words count as simple greetings
+MAX_GREETING_WORDS = 3
+
+# Punctuation stripped from the ends of each word ("hello!" is still a greeting)
+WORD_PUNCTUATION = string.punctuation + "।॥？！，。、؟،"
+
+# Marks the end of a greeting in the trie
+_END = ""
+
+
+class GreetingMatcher:
+    """
+    Matches greetings with a word trie built once from GREETINGS.
+
+    A message is checked in a single pass over its words: from each word, the
+    trie is walked as far as the following words allow, so multi-word greetings
+    ("good morning") and single words are found without scanning the greeting
+    list one entry at a time.
+    """
+
+    def __init__(self, greetings: Dict[str, Optional[str]] = GREETINGS):
+        self.trie: Dict[str, dict] = {}
+        for greeting, language in greetings.items():
+            words = greeting.split()
+            if not words:
+                continue
+            node = self.trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[_END] = (greeting, language)
+
+    def match(self, message: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Check whether a message is a simple greeting.
+
+        Returns:
+            Tuple of (matched greeting, language or None), or None if the message
+            isn't a simple greeting
+        """
+        words = [word.strip(WORD_PUNCTUATION) for word in message.lower().split()]
+        words = [word for word in words if word]
+        if not words or len(words) > MAX_GREETING_WORDS:
+            return None
+
+        for start in range(len(words)):
+            node = self.trie
+            found = None
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                found = node.get(_END, found)
+            if found:
+                return found
+        return None
+
+
+# Sorted, non-overlapping (first code point, last code point, script) ranges
+SCRIPT_RANGES: List[Tuple[int, int, str]] = sorted([
+    (0x0041, 0x005A, "latin"),
+    (0x0061, 0x007A, "latin"),
+    (0x00C0, 0x024F, "latin"),
+    (0x1E00, 0x1EFF, "latin"),
+    (0x0400, 0x04FF, "cyrillic"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0750, 0x077F, "arabic"),
+    (0xFB50, 0xFDFF, "arabic"),
+    (0xFE70, 0xFEFF, "arabic"),
+    (0x0900, 0x097F, "devanagari"),
+    (0xA8E0, 0xA8FF, "devanagari"),
+    (0x3040, 0x309F, "kana"),
+    (0x30A0, 0x30FF, "kana"),
+    (0x3400, 0x4DBF, "han"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xF900, 0xFAFF, "han"),
+    (0xAC00, 0xD7AF, "hangul"),
+])
+_RANGE_STARTS = [start for start, _, _ in SCRIPT_RANGES]
+
+# Reply language for messages written mostly in a non-Latin script
+SCRIPT_LANGUAGES = {
+    "devanagari": "hindi",
+    "arabic": "ar",
+    "cyrillic": "ru",
+    "kana": "ja",
+    "han": "zh",
+    "hangul": "ko",
+}
+
+# Languages written in Devanagari; a Devanagari message keeps any of these
+DEVANAGARI_LANGUAGES = {"hindi", "hi", "kumaoni", "gharwali", "garhwali"}
+
+
+def _char_script(char: str) -> Optional[str]:
+    """Script of a single character, or None for digits, punctuation and unknown scripts"""
+    code = ord(char)
+    index = bisect.bisect_right(_RANGE_STARTS, code) - 1
+    if index >= 0:
+        start, end, script = SCRIPT_RANGES[index]
+        if code <= end:
+            return script
+    return None
+
+
+def detect_script(text: str) -> Optional[str]:
+    """
+    Find the dominant script of a text from the Unicode ranges of its letters.
+
+    Returns:
+        "latin", "devanagari", "arabic", "cyrillic", "kana", "han", "hangul",
+        or None if the text has no letters in a known script
+    """
+    if text.isascii():
+        return "latin" if any(char.isalpha() for char in text) else None
+
+    counts: Dict[str, int] = {}
+    for char in text:
+        script = _char_script(char)
+        if script:
+            counts[script] = counts.get(script, 0) + 1
+    if not counts:
+        return None
+    # Japanese mixes kana with kanji, so any kana makes it Japanese
+    if counts.get("kana") and counts.get("han"):
+        return "kana"
+    return max(counts, key=counts.get)
+
+
+def detect_language(message: str, preferred_language: str) -> str:
+    """
+    Pick the reply language for a message from its script.
+
+    Latin text keeps the user's preferred language, since it can be English
+    as well as romanised Hindi. Devanagari text keeps a preferred Devanagari
+    language (Kumaoni, Garhwali) and otherwise means Hindi.
+    """
+    script = detect_script(message)
+    language = SCRIPT_LANGUAGES.get(script)
+    if language is None:
+        return preferred_language
+    if script == "devanagari" and preferred_language.lower() in DEVANAGARI_LANGUAGES:
+        return preferred_language
+    return language
@@ -1,7 +1,5 @@
 # filepath: d:\code\personal\digicsc-v2\main-service\app\utils\learner_license.py
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from .webdriver_pool import webdriver_pool
 
 def make_learner_license(
     name: str,
@@ -39,18 +37,16 @@ def make_learner_license(
     print("=" * 30)
     
     try:
-        # Initialize Chrome driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
+        # Borrow a Chrome driver from the shared pool
+        with webdriver_pool.driver() as driver:
+            # Open the Parivahan Sewa URL
+            url = "https://parivahan.gov.in/parivahan//en/content/learners-license"
+            driver.get(url)
         
-        # Open the Parivahan Sewa URL
-        url = "https://parivahan.gov.in/parivahan//en/content/learners-license"
-        driver.get(url)
+            print("Parivahan Sewa portal opened in Chrome browser.")
+            print("Registration form would be filled here in a production implementation.")
         
-        print("Parivahan Sewa portal opened in Chrome browser.")
-        print("Registration form would be filled here in a production implementation.")
-        
-        return True
+            return True
     except Exception as e:
         print(f"Failed to open Chrome browser: {e}")
         return False
\ No newline at end of file
@@ -0,0 +1,107 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.db.redis import get_redis
+
+REDIS_PREFIX = "llm_cache:"
+
+# Log hit rates every this many lookups
+STATS_LOG_INTERVAL = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+
+def prompt_fingerprint(prompt: str, language: str, model_config: str) -> str:
+    """
+    Fingerprint a prompt for caching.
+
+    Case and whitespace differences are ignored, so "What documents do I need
+    for a PAN card?" and "what documents do i need for a pan card ?" share an
+    entry, as long as the language and model configuration are the same.
+    """
+    normalised = _WHITESPACE.sub(" ", prompt).strip().casefold()
+    return hashlib.sha256(f"{model_config}\x00{language}\x00{normalised}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache for Gemini results: an in-process LRU with TTLs, backed by
+    the shared Redis so results are reused across workers.
+
+    Entries are grouped in kinds (e.g. "classification", "faq") with their own
+    TTL, and hits and misses are counted per kind in `stats`. A Redis failure
+    only costs the Redis tier; lookups then fall through to Gemini.
+    """
+
+    def __init__(self, ttls: Dict[str, int], max_entries: int = 10000):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self.stats = {
+            kind: {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+            for kind in ttls
+        }
+        self.stats["redis_errors"] = 0
+        self._lookups = 0
+
+    def hit_rate(self, kind: str) -> float:
+        """Share of lookups of a kind answered from either tier"""
+        kind_stats = self.stats[kind]
+        hits = kind_stats["memory_hits"] + kind_stats["redis_hits"]
+        total = hits + kind_stats["misses"]
+        return hits / total if total else 0.0
+
+    def _remember(self, kind: str, key: str, value: str):
+        """Put a value in the in-process tier, evicting the least recently used entry if full"""
+        self._entries[(kind, key)] = (time.monotonic() + self.ttls[kind], value)
+        self._entries.move_to_end((kind, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, kind: str, outcome: str):
+        self.stats[kind][outcome] += 1
+        self._lookups += 1
+        if self._lookups % STATS_LOG_INTERVAL == 0:
+            rates = ", ".join(f"{kind} {self.hit_rate(kind):.1%}" for kind in self.ttls)
+            print(f"LLM cache hit rates: {rates}")
+
+    async def get(self, kind: str, key: str) -> Optional[str]:
+        """Look up a cached result, in process memory first and then in Redis"""
+        entry = self._entries.get((kind, key))
+        if entry:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end((kind, key))
+                self._count(kind, "memory_hits")
+                return value
+            del self._entries[(kind, key)]
+
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                value = await redis_client.get(f"{REDIS_PREFIX}{kind}:{key}")
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                print(f"LLM cache Redis lookup failed: {e}")
+                value = None
+            if value is not None:
+                if isinstance(value, bytes):
+                    value = value.decode("utf-8")
+                self._remember(kind, key, value)
+                self._count(kind, "redis_hits")
+                return value
+
+        self._count(kind, "misses")
+        return None
+
+    async def set(self, kind: str, key: str, value: str):
+        """Store a result in both tiers with the kind's TTL"""
+        self._remember(kind, key, value)
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                await redis_client.set(f"{REDIS_PREFIX}{kind}:{key}", value, ex=self.ttls[kind])
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                print(f"LLM cache Redis write failed: {e}")
@@ -0,0 +1,193 @@
+import asyncio
+import contextvars
+import enum
+import functools
+import heapq
+import itertools
+import random
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+from google.api_core import exceptions as google_exceptions
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Errors worth another attempt: quota, overload and transient server failures
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+# Backoff between attempts when the error doesn't say how long to wait
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 8.0
+
+# "Please retry in 23.5s" in Gemini quota errors
+RETRY_IN_PATTERN = re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+# Retries left for the current request, shared by all its Gemini calls
+_retry_budget: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("llm_retry_budget", default=None)
+
+
+class Priority(enum.IntEnum):
+    """Order in which waiting Gemini calls are let through; lower goes first"""
+    USER = 0
+    BACKGROUND = 1
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait before retrying, if it said"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    match = RETRY_IN_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class LLMScheduler:
+    """
+    Gate for all outbound Gemini calls in the process.
+
+    Calls wait in a priority queue (user-facing replies ahead of background
+    work such as summaries) and are let through while fewer than
+    `max_concurrency` are running and the token bucket (`requests_per_minute`
+    sustained, 0 for no limit, and `burst` at once) has a token left. A quota
+    error with a Retry-After pauses the whole queue for that long.
+
+    Failed calls are retried out of one budget per request (see retry_budget),
+    so a chat turn can't multiply its calls on every layer that retries.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float, burst: int, default_retries: int = 2):
+        self.max_concurrency = max_concurrency
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.default_retries = default_retries
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._active = 0
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "budget_exhausted": 0}
+
+    @contextmanager
+    def retry_budget(self, retries: Optional[int] = None):
+        """Share one retry budget between all Gemini calls made inside the block"""
+        token = _retry_budget.set([self.default_retries if retries is None else retries])
+        try:
+            yield
+        finally:
+            _retry_budget.reset(token)
+
+    def with_retry_budget(self, func):
+        """Decorator giving each call of an async function its own retry budget"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with self.retry_budget():
+                return await func(*args, **kwargs)
+        return wrapper
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """Let waiting calls through, highest priority first, while a slot and a token are free"""
+        self._wakeup = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiting and self._active < self.max_concurrency:
+            if self._waiting[0][2].done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiting)
+                continue
+            token_wait = (1 - self._tokens) / self.rate if self.rate > 0 and self._tokens < 1 else 0.0
+            wait = max(self._paused_until - now, token_wait)
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            _, _, future = heapq.heappop(self._waiting)
+            self._tokens -= 1
+            self._active += 1
+            future.set_result(None)
+
+    def _release(self):
+        self._active -= 1
+        if self._wakeup is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.USER):
+        """Hold one of the concurrency slots, e.g. for the length of a streamed response"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._order), future))
+        if self._wakeup is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the cancellation
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+        try:
+            self.stats["calls"] += 1
+            yield
+        finally:
+            self._release()
+
+    def pause(self, seconds: float):
+        """Hold back all calls for a while, e.g. after a quota error with Retry-After"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: Priority = Priority.USER) -> T:
+        """
+        Run a Gemini call through the queue, retrying transient errors from the
+        request's retry budget (or a fresh default budget outside of one).
+        """
+        budget = _retry_budget.get() or [self.default_retries]
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(priority):
+                    return await call()
+            except RETRYABLE_ERRORS as e:
+                if budget[0] <= 0:
+                    self.stats["budget_exhausted"] += 1
+                    raise
+                budget[0] -= 1
+                attempt += 1
+                self.stats["retries"] += 1
+
+                delay = retry_after(e)
+                if delay is not None:
+                    # The quota is shared, so everyone waits
+                    self.pause(delay)
+                else:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                print(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Process-wide scheduler for all Gemini calls
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+    requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+    burst=settings.GEMINI_BURST,
+    default_retries=settings.GEMINI_RETRY_BUDGET,
+)
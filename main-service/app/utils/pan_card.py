@@ -1,7 +1,5 @@
 # Open NSDL URL in Chrome using Selenium
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from .webdriver_pool import webdriver_pool
 
 def make_pan_card(
     name: str,
@@ -27,6 +25,9 @@ def make_pan_card(
         city: City name
         state: State name
         pin_code: PIN/Postal code
+    
+    Returns:
+        True if the registration form was filled, False otherwise
     """
     print("PAN CARD DETAILS")
     print("=" * 30)
@@ -43,37 +44,37 @@ def make_pan_card(
     
     
     try:
-        # Initialize Chrome driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
-        
-        # Open the NSDL registration URL
-        url = "https://www.onlineservices.nsdl.com/paam/endUserRegisterContact.html"
-        driver.get(url)
+        # Borrow a Chrome driver from the shared pool
+        with webdriver_pool.driver() as driver:
+            # Open the NSDL registration URL
+            url = "https://www.onlineservices.nsdl.com/paam/endUserRegisterContact.html"
+            driver.get(url)
         
-        print("NSDL registration page opened in Chrome browser.")
+            print("NSDL registration page opened in Chrome browser.")
 
-        # Fill the form fields using XPath
-        # Name
-        name_input = driver.find_element("xpath", '//*[@id="l_name_end"]')
-        name_input.clear()
-        name_input.send_keys(name)
+            # Fill the form fields using XPath
+            # Name
+            name_input = driver.find_element("xpath", '//*[@id="l_name_end"]')
+            name_input.clear()
+            name_input.send_keys(name)
 
-        # # Date of Birth (convert to DD/MM/YYYY if needed)
-        # dob_input = driver.find_element("xpath", '//*[@id="date_of_birth_reg"]')
-        # dob_input.clear()
-        # dob_input.send_keys(dob)
+            # # Date of Birth (convert to DD/MM/YYYY if needed)
+            # dob_input = driver.find_element("xpath", '//*[@id="date_of_birth_reg"]')
+            # dob_input.clear()
+            # dob_input.send_keys(dob)
 
-        # Email (dummy value for now)
-        email_input = driver.find_element("xpath", '//*[@id="email_id2"]')
-        email_input.clear()
-        email_input.send_keys(email)
+            # Email (dummy value for now)
+            email_input = driver.find_element("xpath", '//*[@id="email_id2"]')
+            email_input.clear()
+            email_input.send_keys(email)
 
-        # Phone (dummy value for now)
-        phone_input = driver.find_element("xpath", '//*[@id="rvContactNo"]')
-        phone_input.clear()
-        phone_input.send_keys(phone)
+            # Phone (dummy value for now)
+            phone_input = driver.find_element("xpath", '//*[@id="rvContactNo"]')
+            phone_input.clear()
+            phone_input.send_keys(phone)
 
-        print("Form fields filled with provided details.")
+            print("Form fields filled with provided details.")
+            return True
     except Exception as e:
-        print(f"Failed to open Chrome browser: {e}")
\ No newline at end of file
+        print(f"Failed to open Chrome browser: {e}")
+        return False
\ No newline at end of file
@@ -0,0 +1,117 @@
+import time
+from typing import Any, Dict, Optional, Type
+from app.core.config import settings
+from app.db.redis import get_redis
+
+# Versioned states are stored as Redis hashes; the pickled strings written under
+# the old "gemini_state:" prefix simply expire
+REDIS_PREFIX = "conversation_state:"
+
+class ConversationStateStore:
+    """
+    Async store for per-user document conversation state.
+    
+    States live in Redis (through the shared, pooled client from app.db.redis)
+    as one hash per user, with a TTL. A save only writes the hash fields that
+    changed since the state was loaded, in the same round trip as the TTL
+    refresh. While Redis is not configured or failing, states are kept in
+    process memory instead. Redis failures are counted in `stats` and the start
+    and end of an outage are logged, so outages can be measured.
+    
+    The state class must provide to_hash(), from_hash() and a stored_fields
+    attribute, see ConversationState.
+    """
+    
+    def __init__(self, state_class: Type):
+        self.state_class = state_class
+        self._memory: Dict[int, Any] = {}
+        self._outage_started: Optional[float] = None
+        self.stats = {
+            "redis_operations": 0,
+            "redis_errors": 0,
+            "memory_fallbacks": 0,
+            "outage_seconds": 0.0,
+        }
+    
+    def _record_success(self):
+        """Count a successful Redis operation and close any ongoing outage"""
+        self.stats["redis_operations"] += 1
+        if self._outage_started is not None:
+            duration = time.monotonic() - self._outage_started
+            self.stats["outage_seconds"] += duration
+            self._outage_started = None
+            print(f"Redis state store recovered after {duration:.1f}s")
+    
+    def _record_error(self, operation: str, error: Exception):
+        """Count a failed Redis operation and open an outage if none is ongoing"""
+        self.stats["redis_operations"] += 1
+        self.stats["redis_errors"] += 1
+        if self._outage_started is None:
+            self._outage_started = time.monotonic()
+            print(f"Redis state store unavailable ({operation}: {error}). Using in-memory state storage.")
+    
+    async def load(self, user_id: int) -> Optional[Any]:
+        """Load a user's conversation state, or None if there is none"""
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                state_data = await redis_client.hgetall(f"{REDIS_PREFIX}{user_id}")
+                self._record_success()
+                if state_data:
+                    return self.state_class.from_hash(state_data)
+            except Exception as e:
+                self._record_error("load", e)
+        
+        state = self._memory.get(user_id)
+        if state is not None:
+            self.stats["memory_fallbacks"] += 1
+        return state
+    
+    async def save(self, user_id: int, state: Any):
+        """Save the fields of a user's conversation state that changed, refreshing its TTL"""
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                await self._save_to_redis(redis_client, f"{REDIS_PREFIX}{user_id}", state)
+                self._record_success()
+                # Redis holds the current copy now; don't serve a stale one from memory later
+                self._memory.pop(user_id, None)
+                return
+            except Exception as e:
+                self._record_error("save", e)
+        
+        self.stats["memory_fallbacks"] += 1
+        self._memory[user_id] = state
+    
+    async def _save_to_redis(self, redis_client, key: str, state: Any):
+        """Write a state's changed fields to its Redis hash"""
+        fields = state.to_hash()
+        if state.stored_fields is None:
+            changed = fields
+        else:
+            changed = {field: value for field, value in fields.items() if state.stored_fields.get(field) != value}
+        
+        pipeline = redis_client.pipeline(transaction=False)
+        # The first EXPIRE tells whether the hash still exists; if it expired
+        # since the state was loaded, the changed fields alone are not enough
+        pipeline.expire(key, settings.CONVERSATION_STATE_TTL)
+        if changed:
+            pipeline.hset(key, mapping=changed)
+            pipeline.expire(key, settings.CONVERSATION_STATE_TTL)
+        results = await pipeline.execute()
+        
+        if not results[0] and changed is not fields:
+            await redis_client.hset(key, mapping=fields)
+            await redis_client.expire(key, settings.CONVERSATION_STATE_TTL)
+        state.stored_fields = fields
+    
+    async def delete(self, user_id: int):
+        """Delete a user's conversation state"""
+        self._memory.pop(user_id, None)
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                await redis_client.delete(f"{REDIS_PREFIX}{user_id}")
+                self._record_success()
+            except Exception as e:
+                self._record_error("delete", e)
@@ -0,0 +1,144 @@
+import asyncio
+import mimetypes
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from app.core.config import settings
+from app.schemas.chat import MessageType
+from app.utils.file_storage import DERIVATIVES_DIR, FileStorage, message_type_for
+from app.utils.single_flight import SingleFlight
+
+# Variants that can be requested with ?variant=
+THUMB = "thumb"
+VARIANTS = (THUMB,)
+
+# Output formats of derivatives and their content types
+FORMATS = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+def render_thumbnail(source_path: str, target_path: str, image_format: str, is_pdf: bool,
+                     max_size: int, quality: int):
+    """
+    Write a downscaled copy of an image, or of a PDF's first page, no larger
+    than max_size on either side. Runs in the worker processes.
+    """
+    # Imported here so the API starts without the imaging libraries installed
+    from PIL import Image, ImageOps
+
+    if is_pdf:
+        import pymupdf
+        with pymupdf.open(source_path) as document:
+            page = document.load_page(0)
+            zoom = max_size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+        # Lets JPEG decoding skip most of the full-size pixels
+        image.draft("RGB", (max_size, max_size))
+        # Phone photos are often stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+
+    image.thumbnail((max_size, max_size))
+    if image.mode in ("RGBA", "LA", "P") and image_format == "jpeg":
+        # No transparency in JPEG: flatten onto white
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    # Written under a temporary name so a half-written thumbnail is never served
+    partial_path = f"{target_path}.{os.getpid()}.part"
+    image.save(partial_path, format=image_format.upper(), quality=quality)
+    os.replace(partial_path, target_path)
+
+class Thumbnails:
+    """
+    Previews of uploaded images and PDFs for the chat, so clients don't fetch
+    full-size files to draw a chat bubble.
+
+    Derivatives are rendered in a process pool, off the event loop and the
+    GIL, and cached on disk under the content digest of the file, so files
+    with the same content share them. They are rendered after upload and,
+    if missing, on first request; concurrent requests for the same one wait
+    for a single render.
+    """
+
+    def __init__(self, file_storage: FileStorage):
+        self.file_storage = file_storage
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = SingleFlight()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned rather than forked: the API process runs threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _source_type(filename: str, metadata: dict) -> MessageType:
+        content_type = metadata.get("content_type")
+        if not content_type or content_type == "application/octet-stream":
+            # Files uploaded before metadata was kept, or sent without a content type
+            content_type = mimetypes.guess_type(filename)[0]
+        return message_type_for(content_type)
+
+    async def get(self, filename: str, variant: str = THUMB, image_format: str = "webp") -> Optional[str]:
+        """
+        Path of a derivative of an uploaded file, rendering it if it isn't cached.
+
+        Returns None if the file doesn't exist or no preview can be made of it.
+        """
+        file_path = self.file_storage.get_file_path(filename)
+        if not file_path or variant not in VARIANTS or image_format not in FORMATS:
+            return None
+        metadata = self.file_storage.get_metadata(filename) or {}
+        source_type = self._source_type(filename, metadata)
+        if source_type not in (MessageType.IMAGE, MessageType.PDF):
+            return None
+
+        key = self.file_storage.derivative_key(filename, metadata)
+        target_path = os.path.join(DERIVATIVES_DIR, f"{key}-{variant}.{image_format}")
+        if os.path.exists(target_path):
+            return target_path
+
+        async def render() -> Optional[str]:
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), render_thumbnail, file_path, target_path, image_format,
+                    source_type == MessageType.PDF, settings.THUMBNAIL_MAX_SIZE, settings.THUMBNAIL_QUALITY
+                )
+                return target_path
+            except BrokenProcessPool as e:
+                # A worker died (e.g. out of memory on a huge image); start a fresh pool next time
+                print(f"Error rendering {variant} of {filename}: {e}")
+                self.close()
+                return None
+            except Exception as e:
+                print(f"Error rendering {variant} of {filename}: {e}")
+                return None
+
+        return await self._in_flight.do(target_path, render)
+
+    async def pregenerate(self, filename: str):
+        """Render a file's previews ahead of the first request for them"""
+        for image_format in FORMATS:
+            await self.get(filename, THUMB, image_format)
+
+# Process-wide thumbnail renderer for uploaded files
+thumbnails = Thumbnails(FileStorage())
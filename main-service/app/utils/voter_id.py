@@ -1,7 +1,5 @@
 # filepath: d:\code\personal\digicsc-v2\main-service\app\utils\voter_id.py
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from .webdriver_pool import webdriver_pool
 
 def make_voter_id(
     name: str,
@@ -39,18 +37,16 @@ def make_voter_id(
     print("=" * 30)
     
     try:
-        # Initialize Chrome driver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service)
+        # Borrow a Chrome driver from the shared pool
+        with webdriver_pool.driver() as driver:
+            # Open the National Voter Service Portal URL
+            url = "https://voters.eci.gov.in/"
+            driver.get(url)
         
-        # Open the National Voter Service Portal URL
-        url = "https://voters.eci.gov.in/"
-        driver.get(url)
+            print("National Voter Service Portal opened in Chrome browser.")
+            print("Registration form would be filled here in a production implementation.")
         
-        print("National Voter Service Portal opened in Chrome browser.")
-        print("Registration form would be filled here in a production implementation.")
-        
-        return True
+            return True
     except Exception as e:
         print(f"Failed to open Chrome browser: {e}")
         return False
\ No newline at end of file
@@ -0,0 +1,166 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from app.core.config import settings
+
+class WebDriverPool:
+    """
+    Pool of Chrome WebDrivers shared by the document automations.
+
+    Drivers are started once (optionally ahead of the first job, see prewarm)
+    and reused: a checked-out driver is health-checked first, and on return
+    all cookies and site storage are cleared and it gets a fresh blank tab.
+    Drivers are quit after `max_uses` jobs, when a job raises, or when they
+    fail a check or reset, and at most `max_size` exist at a time. Callers run in worker threads, so the pool
+    is thread-safe and blocking.
+    """
+
+    def __init__(self, max_size: int, max_uses: int, headless: bool = True):
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.headless = headless
+        self._idle: List[Tuple[webdriver.Chrome, int]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._driver_path: Optional[str] = None
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "discarded": 0}
+
+    def _service(self) -> Service:
+        """Chromedriver service; the driver binary is looked up once per process"""
+        with self._lock:
+            if self._driver_path is None:
+                self._driver_path = ChromeDriverManager().install()
+        return Service(self._driver_path)
+
+    def _create(self) -> webdriver.Chrome:
+        options = Options()
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--window-size=1366,900")
+        driver = webdriver.Chrome(service=self._service(), options=options)
+        self.stats["created"] += 1
+        return driver
+
+    @staticmethod
+    def _is_healthy(driver: webdriver.Chrome) -> bool:
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(driver: webdriver.Chrome) -> bool:
+        """
+        Clear everything the last applicant's session left behind; False if
+        that fails, in which case the driver must not be reused.
+
+        Cookies are cleared browser-wide and all storage (localStorage,
+        IndexedDB, caches, service workers) of every origin the tab visited;
+        the job then gets a new tab, which has fresh sessionStorage.
+        """
+        try:
+            history = driver.execute_cdp_cmd("Page.getNavigationHistory", {})
+            origins = set()
+            for address in [entry.get("url", "") for entry in history.get("entries", [])] + [driver.current_url]:
+                url = urlsplit(address)
+                if url.scheme in ("http", "https"):
+                    origins.add(f"{url.scheme}://{url.netloc}")
+
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+            for origin in origins:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+            # Replace every tab with a single blank one
+            old_handles = driver.window_handles
+            driver.switch_to.new_window("tab")
+            for handle in old_handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"Could not reset WebDriver, replacing it: {e}")
+            return False
+
+    @staticmethod
+    def _quit(driver: webdriver.Chrome):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error quitting WebDriver: {e}")
+
+    def _take(self) -> Tuple[webdriver.Chrome, int]:
+        """An idle healthy driver with its use count, or a new one"""
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._create(), 0
+            if self._is_healthy(entry[0]):
+                self.stats["reused"] += 1
+                return entry
+            self._quit(entry[0])
+            self.stats["discarded"] += 1
+
+    @contextmanager
+    def driver(self) -> Iterator[webdriver.Chrome]:
+        """Check out a driver for one automation; blocks while `max_size` drivers are in use"""
+        self._slots.acquire()
+        try:
+            driver, uses = self._take()
+            try:
+                yield driver
+            except BaseException:
+                # The page may be in any state; don't hand it to the next applicant
+                self._quit(driver)
+                self.stats["discarded"] += 1
+                raise
+
+            uses += 1
+            if uses >= self.max_uses or not self._reset(driver):
+                self._quit(driver)
+                self.stats["recycled"] += 1
+            else:
+                with self._lock:
+                    self._idle.append((driver, uses))
+        finally:
+            self._slots.release()
+
+    def prewarm(self, count: int):
+        """Start up to `count` idle drivers ahead of the first job"""
+        for _ in range(min(count, self.max_size)):
+            with self._lock:
+                if len(self._idle) >= min(count, self.max_size):
+                    return
+            try:
+                driver = self._create()
+            except Exception as e:
+                print(f"Warning: Could not pre-start a WebDriver ({str(e)})")
+                return
+            with self._lock:
+                self._idle.append((driver, 0))
+        print(f"WebDriver pool pre-started {len(self._idle)} drivers")
+
+    def close(self):
+        """Quit all idle drivers"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            self._quit(driver)
+
+# Process-wide pool used by the automation modules
+webdriver_pool = WebDriverPool(
+    max_size=settings.WEBDRIVER_POOL_SIZE,
+    max_uses=settings.WEBDRIVER_MAX_USES,
+    headless=settings.WEBDRIVER_HEADLESS,
+)
@@ -0,0 +1,39 @@
+"""
+Standalone worker for background jobs (the document automations).
+
+Run `python -m app.worker` next to the API, with Redis configured and
+AUTOMATION_WORKERS=0 on the API processes, to keep browsers off the API
+servers. The number of concurrent jobs is AUTOMATION_WORKERS (at least 1).
+"""
+import asyncio
+from app.core.config import settings
+from app.db.mongodb import connect_to_mongo, close_mongo_connection
+from app.db.redis import connect_to_redis, close_redis_connection, get_redis
+from app.utils.chat_broker import chat_broker
+# Registers the automation job handlers
+import app.utils.gemini_assistant  # noqa: F401
+from app.utils.job_queue import job_queue
+from app.utils.webdriver_pool import webdriver_pool
+
+async def main():
+    await connect_to_mongo()
+    await connect_to_redis()
+    if not get_redis():
+        print("Warning: No Redis connection; this worker can't see jobs queued by the API")
+    await chat_broker.connect()
+    await job_queue.start(max(settings.AUTOMATION_WORKERS, 1))
+    await asyncio.to_thread(webdriver_pool.prewarm, settings.WEBDRIVER_PREWARM)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_queue.close()
+        await asyncio.to_thread(webdriver_pool.close)
+        await chat_broker.close()
+        await close_redis_connection()
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: greeting matching and reply language detection per message.
+
+Compares the previous per-message work in process_chat (two linear scans of
+the greeting list plus three substring scans for the greeting language) with
+the trie-based GreetingMatcher plus the script-based detect_language, over a
+corpus of typical chat messages. Run from main-service/:
+
+    python benchmarks/bench_language_detection.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "benchmark")
+
+from app.utils.language_detection import GREETINGS, GreetingMatcher, detect_language
+
+ITERATIONS = 200
+
+# Typical messages: greetings, requests and form answers in English, Hindi,
+# romanised Hindi and a few other scripts
+CORPUS = [
+    "hello", "Hi", "namaste", "नमस्ते", "good morning", "राम राम", "जय बदरी विशाल", "hola",
+    "I need a PAN card", "voter id banwana hai", "मुझे पैन कार्ड बनवाना है",
+    "learner license apply karna hai", "what documents do I need for a pan card?",
+    "Ravi Kumar Bisht", "14-08-1992", "ravi.bisht@example.com", "9876543210", "Male", "पुरुष",
+    "Village Jakh, Post Bhimtal, District Nainital", "Uttarakhand", "263136", "yes", "haan",
+    "मेरा नाम राम सिंह है", "can you help me build a website for my shop?",
+    "मुझे वोटर आईडी चाहिए और मेरा पता बदलना है", "thank you", "مرحبا", "你好",
+    "bhimtal", "ok",
+]
+
+# The previous greeting list, including the "" entry
+OLD_GREETING_TERMS = [
+    "hello", "hi", "hey", "good morning", "good afternoon", "good evening", "greetings", "welcome", "namaste", "namastey", "",
+    "नमस्ते", "नमस्कार", "प्रणाम", "सुप्रभात", "शुभ दिन",
+    "hola", "buenos días", "buenas tardes", "buenas noches",
+    "bonjour", "salut", "bonsoir",
+    "hallo", "guten tag", "guten morgen",
+    "ciao", "buongiorno", "salve",
+    "olá", "bom dia", "boa tarde",
+    "привет", "здравствуйте", "добрый день",
+    "こんにちは", "おはよう", "こんばんは",
+    "你好", "早上好", "晚上好",
+    "مرحبا", "السلام عليكم", "صباح الخير",
+    "राम राम", "जय हो", "सत श्री अकाल", "वणक्कम्", "अदाब", "नमो नमः"
+]
+OLD_HINDI = ["नमस्ते", "नमस्कार", "प्रणाम", "सुप्रभात", "शुभ दिन", "राम राम", "जय हो",
+             "सत श्री अकाल", "नमो नमः", "namaste", "namaskar", "namastey",
+             "namaskaar", "pranaam", "ram ram"]
+OLD_KUMAONI = ["जय बो"]
+OLD_GARHWALI = ["जय भगवान", "जय बदरी विशाल"]
+
+def old_is_simple_greeting(message: str) -> bool:
+    message_lower = message.lower().strip()
+    if len(message_lower.split()) <= 3:
+        for greeting in OLD_GREETING_TERMS:
+            if greeting == message_lower or f" {greeting} " in f" {message_lower} ":
+                return True
+    return False
+
+def old_detect_greeting_language(message: str) -> str:
+    message_lower = message.lower().strip()
+    for greetings, language in ((OLD_HINDI, "hindi"), (OLD_KUMAONI, "kumaoni"), (OLD_GARHWALI, "gharwali")):
+        for greeting in greetings:
+            if greeting == message_lower or greeting in message_lower:
+                return language
+    return "en"
+
+def old_per_message(message: str, language: str) -> str:
+    # As in process_chat: greeting check, greeting language, greeting check again
+    if old_is_simple_greeting(message):
+        detected = old_detect_greeting_language(message)
+        if detected != "en":
+            language = detected
+    old_is_simple_greeting(message)
+    return language
+
+matcher = GreetingMatcher()
+
+def new_per_message(message: str, language: str) -> str:
+    detected = detect_language(message, language)
+    greeting = matcher.match(message)
+    if greeting and greeting[1]:
+        detected = greeting[1]
+    return detected
+
+def per_message_us(function) -> float:
+    def run():
+        for message in CORPUS:
+            function(message, "english")
+    return timeit.timeit(run, number=ITERATIONS) / (ITERATIONS * len(CORPUS)) * 1e6
+
+def main():
+    print(f"{len(CORPUS)} messages, {len(GREETINGS)} greetings")
+    print(f"{'':34}{'us/message':>12}")
+    print(f"{'linear scans (greetings only)':34}{per_message_us(old_per_message):>12.2f}")
+    print(f"{'trie + script detection':34}{per_message_us(new_per_message):>12.2f}")
+
+    changed = [(message, old_per_message(message, "english"), new_per_message(message, "english"))
+               for message in CORPUS if old_per_message(message, "english") != new_per_message(message, "english")]
+    print("\nReply language changes:")
+    for message, old, new in changed:
+        print(f"  {message!r}: {old} -> {new}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: ConversationState serialization, hash fields vs pickle.
+
+Compares encode/decode time and stored bytes per state, and the bytes written
+for a typical turn (one detail field changed). Run from main-service/:
+
+    python benchmarks/bench_state_serialization.py
+"""
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "benchmark")
+
+from app.utils.gemini_assistant import AutomationType, ConversationState, DocumentField
+
+ITERATIONS = 20000
+
+def make_state() -> ConversationState:
+    """A state halfway through a PAN card application"""
+    state = ConversationState()
+    state.set_document_type(AutomationType.PAN_CARD)
+    state.details.update({
+        "name": "Ravi Kumar Bisht",
+        "father_name": "Mohan Singh Bisht",
+        "dob": "14-08-1992",
+        "email": "ravi.bisht@example.com",
+        "phone": "9876543210",
+    })
+    state.current_field = DocumentField.GENDER
+    return state
+
+def hash_bytes(fields: dict) -> int:
+    """Payload bytes of a Redis hash (field names plus values)"""
+    return sum(len(key.encode()) + len(value.encode()) for key, value in fields.items())
+
+def per_op_us(statement) -> float:
+    return timeit.timeit(statement, number=ITERATIONS) / ITERATIONS * 1e6
+
+def main():
+    state = make_state()
+    pickled = pickle.dumps(state)
+    fields = state.to_hash()
+    redis_fields = {key.encode(): value.encode() for key, value in fields.items()}
+
+    # One turn: the user answers the gender question
+    state.stored_fields = fields
+    state.details["gender"] = "Male"
+    state.next_field()
+    after = state.to_hash()
+    changed = {key: value for key, value in after.items() if fields.get(key) != value}
+    # The pickle approach rewrites the whole state and has no snapshot to carry
+    state.stored_fields = None
+    pickled_after = pickle.dumps(state)
+
+    print(f"{'':24}{'pickle':>12}{'hash':>12}")
+    print(f"{'encode (us/op)':24}{per_op_us(lambda: pickle.dumps(state)):>12.2f}{per_op_us(state.to_hash):>12.2f}")
+    print(f"{'decode (us/op)':24}{per_op_us(lambda: pickle.loads(pickled)):>12.2f}"
+          f"{per_op_us(lambda: ConversationState.from_hash(redis_fields)):>12.2f}")
+    print(f"{'bytes per state':24}{len(pickled):>12}{hash_bytes(fields):>12}")
+    print(f"{'bytes written per turn':24}{len(pickled_after):>12}{hash_bytes(changed):>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+import os
+
+# app.utils.gemini_assistant refuses to import without a key; no request is made with it
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "test")
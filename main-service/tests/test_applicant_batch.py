@@ -0,0 +1,103 @@
+import asyncio
+import io
+import json
+import pytest
+from fastapi import UploadFile
+from app.utils import applicant_batch
+from app.utils.applicant_batch import ApplicantBatches, _csv_records, _ndjson_records, _read_lines, validate_applicant
+
+VOTER = {
+    "name": "Ravi Kumar",
+    "father_name": "Mohan Kumar",
+    "dob": "14/08/1992",
+    "address": "12, Mall Road",
+    "city": "Almora",
+    "state": "uttrakhand",
+    "pin_code": "263 601",
+}
+
+def _upload(text: str, filename: str) -> UploadFile:
+    return UploadFile(io.BytesIO(text.encode("utf-8")), filename=filename)
+
+async def _collect(records):
+    return [record async for record in records]
+
+def _csv(text: str):
+    return asyncio.run(_collect(_csv_records(_read_lines(_upload(text, "applicants.csv")))))
+
+def _ndjson(text: str):
+    return asyncio.run(_collect(_ndjson_records(_read_lines(_upload(text, "applicants.ndjson")))))
+
+def test_csv_quoted_values_with_commas():
+    rows = _csv('name,address\n"Kumar, Ravi","12, Mall Road, Almora"\n')
+    assert rows == [(1, {"name": "Kumar, Ravi", "address": "12, Mall Road, Almora"}, None)]
+
+def test_csv_multiline_values():
+    rows = _csv('name,address\r\nRavi,"12 Mall Road\r\nAlmora"\r\nSita,Nainital\r\n')
+    assert rows == [
+        (1, {"name": "Ravi", "address": "12 Mall Road\nAlmora"}, None),
+        (2, {"name": "Sita", "address": "Nainital"}, None),
+    ]
+
+def test_csv_header_aliases():
+    rows = _csv("﻿Type,Full Name,Father's Name,Date of Birth,Mobile Number,Pincode\nvoter,Ravi,Mohan,14-08-1992,9876543210,263601\n")
+    assert rows[0][1] == {
+        "document_type": "voter", "name": "Ravi", "father_name": "Mohan",
+        "dob": "14-08-1992", "phone": "9876543210", "pin_code": "263601",
+    }
+
+def test_csv_unterminated_quote():
+    rows = _csv('name,address\nRavi,"12 Mall Road\n')
+    assert rows == [(1, {}, "unterminated quoted value")]
+
+def test_ndjson_errors_per_line():
+    rows = _ndjson('{"Full Name": "Ravi"}\n\nnot json\n[1, 2]\n')
+    assert rows == [
+        (1, {"name": "Ravi"}, None),
+        (2, {}, "not valid JSON"),
+        (3, {}, "not a JSON object"),
+    ]
+
+def test_validate_normalises_fields():
+    document_type, details, errors = validate_applicant({"document_type": "EPIC", **VOTER}, None)
+    assert errors == []
+    assert document_type == "voter_id"
+    assert details["dob"] == "14-08-1992"
+    assert details["state"] == "Uttarakhand"
+    assert details["pin_code"] == "263601"
+
+@pytest.mark.parametrize("record, default, errors", [
+    (VOTER, None, ["document_type is missing"]),
+    ({**VOTER, "document_type": "passport"}, None, ["unknown document type: passport"]),
+    ({**VOTER, "city": " "}, "voter_id", ["city is missing"]),
+    ({**VOTER, "dob": "31-02-1992", "pin_code": "12"}, "voter_id", ["dob is not valid", "pin_code is not valid"]),
+])
+def test_validate_reports_errors(record, default, errors):
+    assert validate_applicant(record, default)[2] == errors
+
+def test_submit_queues_valid_rows_and_reports_the_rest(monkeypatch):
+    queued = []
+
+    async def enqueue(job_type, payload, label="", chat_id=None, user_id=None):
+        queued.append((job_type, payload))
+        return {"job_id": f"job-{len(queued)}"}
+
+    monkeypatch.setattr(applicant_batch.job_queue, "enqueue", enqueue)
+    monkeypatch.setattr(applicant_batch, "get_redis", lambda: None)
+    lines = [
+        json.dumps(VOTER),
+        json.dumps({**VOTER, "name": "RAVI KUMAR"}),
+        json.dumps({**VOTER, "pin_code": ""}),
+        "{",
+        json.dumps({**VOTER, "name": "Sita Devi"}),
+    ]
+    batch = asyncio.run(ApplicantBatches().submit(_upload("\n".join(lines), "camp.ndjson"), "ndjson", "voter_id"))
+
+    assert [job_type for job_type, _ in queued] == ["voter_id", "voter_id"]
+    assert [(row["row"], row["job_id"], row["errors"]) for row in batch["rows"]] == [
+        (1, "job-1", []),
+        (2, None, ["duplicate of row 1"]),
+        (3, None, ["pin_code is missing"]),
+        (4, None, ["not valid JSON"]),
+        (5, "job-2", []),
+    ]
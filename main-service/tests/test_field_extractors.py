@@ -0,0 +1,68 @@
+import pytest
+from app.utils.field_extractors import extract_dob, extract_gender, extract_phone, extract_pin_code, extract_state
+
+@pytest.mark.parametrize("message, phone", [
+    ("9876543210", "9876543210"),
+    ("my number is +91 98765 43210", "9876543210"),
+    ("09876543210", "9876543210"),
+    ("९८७६५४३२१०", "9876543210"),
+    ("12345", None),
+    ("1234567890", None),
+])
+def test_extract_phone(message, phone):
+    assert extract_phone(message) == phone
+
+@pytest.mark.parametrize("message, pin_code", [
+    ("263136", "263136"),
+    ("pin is 263 136", "263136"),
+    ("०११००१", None),
+    ("२६३१३६", "263136"),
+    ("12345", None),
+])
+def test_extract_pin_code(message, pin_code):
+    assert extract_pin_code(message) == pin_code
+
+@pytest.mark.parametrize("message, dob", [
+    ("14-08-1992", "14-08-1992"),
+    ("14/8/1992", "14-08-1992"),
+    ("1992-08-14", "14-08-1992"),
+    ("born on 14th Aug, 1992", "14-08-1992"),
+    ("August 14, 1992", "14-08-1992"),
+    ("14 अगस्त 1992", "14-08-1992"),
+    ("31-02-1992", None),
+    ("14-08-2999", None),
+    ("no date here", None),
+])
+def test_extract_dob(message, dob):
+    assert extract_dob(message) == dob
+
+@pytest.mark.parametrize("message, state", [
+    ("Uttarakhand", "Uttarakhand"),
+    ("UP", "Uttar Pradesh"),
+    ("I live in west bengal", "West Bengal"),
+    ("Jammu & Kashmir", "Jammu and Kashmir"),
+    ("uttrakhand", "Uttarakhand"),
+    ("maharastra", "Maharashtra"),
+    ("उत्तर प्रदेश", "Uttar Pradesh"),
+    ("I am from up the hill", None),
+    ("xyz", None),
+])
+def test_extract_state(message, state):
+    assert extract_state(message) == state
+
+@pytest.mark.parametrize("message, gender", [
+    ("male", "Male"),
+    ("M", "Male"),
+    ("f", "Female"),
+    ("I'm male", "Male"),
+    ("I'm female", "Female"),
+    ("I am a woman", "Female"),
+    ("महिला", "Female"),
+    ("ladka", "Male"),
+    ("transgender", "Transgender"),
+    ("male or female?", None),
+    ("f m", None),
+    ("my name is Ravi", None),
+])
+def test_extract_gender(message, gender):
+    assert extract_gender(message) == gender
@@ -0,0 +1,40 @@
+import pytest
+from app.utils.intent_classifier import FREELANCER, IntentClassifier, LEARNER_LICENSE, PAN_CARD, VOTER_ID
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier(threshold=0.8)
+
+@pytest.mark.parametrize("message, intent", [
+    ("I need a PAN card", PAN_CARD),
+    ("pan card chahiye", PAN_CARD),
+    ("पैन कार्ड बनवाना है", PAN_CARD),
+    ("voter id banwana hai", VOTER_ID),
+    ("I want to apply for learner licence", LEARNER_LICENSE),
+    ("I need a freelancer", FREELANCER),
+    ("I want a website for my business", FREELANCER),
+])
+def test_new_application_requests_are_classified(classifier, message, intent):
+    assert classifier.classify(message) == intent
+
+@pytest.mark.parametrize("message", [
+    "PAN card",
+    "pan card update karna hai",
+    "mera pan card kho gaya",
+    "PAN card status check",
+    "I want to renew my driving license",
+    "I need a trade licence",
+    "a new license for my shop",
+    "what documents do I need for a voter id?",
+])
+def test_other_document_messages_are_left_to_the_llm(classifier, message):
+    assert classifier.classify(message) is None
+
+@pytest.mark.parametrize("message", [
+    "I want to check my website",
+    "website update karna hai",
+    "freelancer",
+    "what is your website?",
+])
+def test_other_freelancer_messages_are_left_to_the_llm(classifier, message):
+    assert classifier.classify(message) is None
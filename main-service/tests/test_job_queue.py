@@ -0,0 +1,39 @@
+import asyncio
+from app.schemas.job import JobStatus
+from app.utils.job_queue import JobQueue
+
+async def _run_job(handler):
+    """Run one job through an in-memory queue and return it once finished"""
+    queue = JobQueue()
+    queue.register("test", handler)
+    await queue.start(1)
+    try:
+        job = await queue.enqueue("test", {"name": "Ram"}, label="Test document")
+        for _ in range(200):
+            if job["status"] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                break
+            await asyncio.sleep(0.01)
+        return job
+    finally:
+        await queue.close()
+
+def test_job_completes_when_handler_succeeds():
+    job = asyncio.run(_run_job(lambda name: True))
+    assert job["status"] == JobStatus.COMPLETED.value
+    assert job["error"] is None
+
+def test_job_fails_when_handler_returns_false():
+    job = asyncio.run(_run_job(lambda name: False))
+    assert job["status"] == JobStatus.FAILED.value
+    assert "did not complete" in job["error"]
+
+def test_job_fails_when_handler_returns_nothing():
+    job = asyncio.run(_run_job(lambda name: None))
+    assert job["status"] == JobStatus.FAILED.value
+
+def test_job_fails_when_handler_raises():
+    def handler(name):
+        raise ValueError("portal unavailable")
+    job = asyncio.run(_run_job(handler))
+    assert job["status"] == JobStatus.FAILED.value
+    assert job["error"] == "portal unavailable"
@@ -0,0 +1,88 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import uploads
+from app.utils import file_storage
+
+CONTENT = b"0123456789"
+SHA256 = "ab" * 32
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_storage, "UPLOADS_DIR", tmp_path)
+    monkeypatch.setattr(file_storage, "METADATA_DIR", tmp_path / "meta")
+    (tmp_path / "meta").mkdir()
+    (tmp_path / "file.txt").write_bytes(CONTENT)
+    (tmp_path / "meta" / "file.txt.json").write_text(json.dumps({
+        "sha256": SHA256, "size": len(CONTENT), "filename": "notes.txt", "content_type": "text/plain",
+    }))
+    (tmp_path / "empty.txt").write_bytes(b"")
+    app = FastAPI()
+    app.include_router(uploads.router)
+    return TestClient(app)
+
+def test_full_download(client):
+    response = client.get("/uploads/file.txt")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{SHA256}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-disposition"] == 'attachment; filename="notes.txt"'
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+def test_unknown_file(client):
+    assert client.get("/uploads/missing.txt").status_code == 404
+
+@pytest.mark.parametrize("range_header, content_range, body", [
+    ("bytes=2-5", "bytes 2-5/10", b"2345"),
+    ("bytes=7-", "bytes 7-9/10", b"789"),
+    ("bytes=-3", "bytes 7-9/10", b"789"),
+    ("bytes=8-100", "bytes 8-9/10", b"89"),
+])
+def test_range(client, range_header, content_range, body):
+    full = client.get("/uploads/file.txt")
+    response = client.get("/uploads/file.txt", headers={"Range": range_header})
+    assert response.status_code == 206
+    assert response.content == body
+    assert response.headers["content-range"] == content_range
+    assert response.headers["content-length"] == str(len(body))
+    for header in ("etag", "cache-control", "content-disposition", "x-content-type-options", "content-type"):
+        assert response.headers[header] == full.headers[header]
+
+def test_several_ranges(client):
+    response = client.get("/uploads/file.txt", headers={"Range": "bytes=0-1,4-5"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert b"01" in response.content and b"45" in response.content
+
+@pytest.mark.parametrize("range_header", ["items=0-1", "bytes=5-2"])
+def test_malformed_range(client, range_header):
+    assert client.get("/uploads/file.txt", headers={"Range": range_header}).status_code == 400
+
+@pytest.mark.parametrize("filename, range_header, size", [
+    ("file.txt", "bytes=10-", 10),
+    ("file.txt", "bytes=-0", 10),
+    ("empty.txt", "bytes=-5", 0),
+    ("empty.txt", "bytes=0-", 0),
+])
+def test_unsatisfiable_range(client, filename, range_header, size):
+    response = client.get(f"/uploads/{filename}", headers={"Range": range_header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+def test_if_range_with_stale_etag_sends_whole_file(client):
+    response = client.get("/uploads/file.txt", headers={"Range": "bytes=2-5", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+@pytest.mark.parametrize("if_none_match", [f'"{SHA256}"', f'"other", "{SHA256}"', "*"])
+def test_not_modified(client, if_none_match):
+    response = client.get("/uploads/file.txt", headers={"If-None-Match": if_none_match})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{SHA256}"'
+
+def test_modified(client):
+    response = client.get("/uploads/file.txt", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200